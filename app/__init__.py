@@ -13,12 +13,61 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
 
+    from .models.reader_pool import reader_pool
+    reader_pool.init_app(app)
+
+    from .models.preprocessing import Pipeline
+    Pipeline.init_app(app)
+
+    from .models.object_detection import detection_service
+    detection_service.init_app(app)
+
+    from .models import batch_ocr
+    batch_ocr.init_app(app)
+
+    from .models import region_ocr
+    region_ocr.init_app(app)
+
+    from .models.jobs import job_queue
+    job_queue.init_app(app)
+
+    from .models.doc_cache import result_cache
+    result_cache.init_app(app)
+
+    from .models import symspell_snapshot
+    symspell_snapshot.init_app(app)
+
+    from .models.correction import correction_cache
+    correction_cache.init_app(app)
+
+    from .models.segmentation import segmentation_engine
+    segmentation_engine.init_app(app)
+
+    from .models.customer_scoring import customer_scorer
+    customer_scorer.init_app(app)
+
+    from .models.recommendations import recommender
+    recommender.init_app(app)
+
+    from .models.llm_client import llm_client
+    llm_client.init_app(app)
+
+    from .commands import register_commands
+    register_commands(app)
+
     with app.app_context():
         db.create_all()
 
+    from .models.search import search_index
+    search_index.init_app(app)
+
     from .routes import main_bp
     app.register_blueprint(main_bp)
 
+    # Models register themselves when their modules are imported above
+    from .models.registry import registry
+    registry.init_app(app)
+
     # Configure logging inside the application context
     #logging.basicConfig(filename='error.log', level=logging.ERROR)
     logging.basicConfig(filename='app.log', level=logging.INFO,format='%(asctime)s %(levelname)s %(message)s')
@@ -0,0 +1,144 @@
+from datetime import datetime, date, timedelta
+import click
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def register_commands(app):
+    @app.cli.command('build-symspell')
+    def build_symspell():
+        """Rebuild the SymSpell dictionary snapshots."""
+        from .models import symspell_snapshot
+        for language in symspell_snapshot.DICTIONARIES:
+            _, path = symspell_snapshot.build_snapshot(language)
+            print(f'{language}: {path}')
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--start', help='First invoice date to rebuild (YYYY-MM-DD)')
+    @click.option('--end', help='Last invoice date to rebuild (YYYY-MM-DD)')
+    def rebuild_rollups_command(start, end):
+        """Recompute the daily sales rollups from the invoice tables."""
+        from .models.rollups import rebuild_rollups
+        rebuild_rollups(_parse_date(start), _parse_date(end))
+        print('Rollups rebuilt')
+
+    @app.cli.command('rebuild-features')
+    def rebuild_features_command():
+        """Recompute the per-customer RFM features from the invoice tables."""
+        from .models.features import rebuild_customer_features
+        rebuild_customer_features()
+        print('Customer features rebuilt')
+
+    @app.cli.command('train-customer-models')
+    @click.option('--cutoff', help='Train on history before this date and outcomes after it (YYYY-MM-DD, default: HORIZON days ago)')
+    @click.option('--horizon', default=180, help='Days after the cutoff used for the CLV and churn labels')
+    @click.option('--organization-id', type=int, help='Only train on this organization')
+    @click.option('--n-jobs', default=-1, help='Parallel jobs for training (-1 for every core)')
+    def train_customer_models_command(cutoff, horizon, organization_id, n_jobs):
+        """Train and save a new version of the CLV and churn models."""
+        from .models.customer_scoring import customer_scorer, training_frame
+        cutoff = _parse_date(cutoff) or date.today() - timedelta(days=horizon)
+        frame = training_frame(cutoff, horizon, organization_id)
+        version, metrics = customer_scorer.train(frame, n_jobs=n_jobs)
+        print(f'Saved version {version}: {metrics}')
+
+    @app.cli.command('fit-segments')
+    @click.option('--organization-id', type=int, help='Only segment this organization')
+    @click.option('--clusters', type=int, help='Number of segments (default: picked from the elbow curve)')
+    def fit_segments_command(organization_id, clusters):
+        """Fit and save the customer segmentation from the feature table."""
+        from .models.features import feature_matrix
+        from .models.segmentation import segmentation_engine
+        _, features = feature_matrix(organization_id)
+        if not len(features):
+            raise SystemExit('No customer features, run `flask rebuild-features` first')
+        model = segmentation_engine.fit(features, organization_id, n_clusters=clusters)
+        print(f'Saved {model.k} segments for {len(features)} customers')
+
+    @app.cli.command('check-rollups')
+    @click.option('--start', help='First invoice date to check (YYYY-MM-DD)')
+    @click.option('--end', help='Last invoice date to check (YYYY-MM-DD)')
+    def check_rollups_command(start, end):
+        """Compare the daily sales rollups against the invoice tables."""
+        from .models.rollups import check_rollups
+        mismatches = check_rollups(_parse_date(start), _parse_date(end))
+        for mismatch in mismatches:
+            print(f"{mismatch['table']} {mismatch['key']}: expected {mismatch['expected']}, found {mismatch['actual']}")
+        print(f'{len(mismatches)} mismatched rows')
+        if mismatches:
+            raise SystemExit(1)
+
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Add indexes declared on the models that the database is missing."""
+        from . import db
+        from .models.query_audit import create_indexes
+        created = create_indexes(db.engine)
+        print(f"Created {len(created)} indexes: {', '.join(created) or '-'}")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Reindex every document for full-text search."""
+        from .models.search import search_index
+        search_index.ensure()
+        search_index.rebuild()
+        print('Search index rebuilt')
+
+    @app.cli.command('export-detector')
+    @click.option('--output', default=None, help='ONNX file to write (defaults to DETECTION_ONNX_PATH)')
+    @click.option('--int8', is_flag=True, help='Also write a dynamically quantized INT8 model')
+    def export_detector_command(output, int8):
+        """Export the torch detection model to ONNX."""
+        import os
+        from .models.registry import registry
+        from .models.inference import export_onnx
+        from .models import object_detection  # registers the detector
+        output = output or app.config['DETECTION_ONNX_PATH']
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        print(export_onnx(registry.get('detector'), output, int8=int8))
+
+    @app.cli.command('benchmark-detection')
+    @click.argument('images', nargs=-1, required=True)
+    @click.option('--onnx', default=None, help='ONNX model to compare (defaults to DETECTION_ONNX_PATH)')
+    @click.option('--batch-size', default=8, help='Images per batch')
+    @click.option('--repeat', default=3, help='Timed passes over the images')
+    @click.option('--min-recall', default=0.95, help='Fail when fewer torch boxes than this are matched')
+    def benchmark_detection_command(images, onnx, batch_size, repeat, min_recall):
+        """Compare ONNX detections and throughput against the torch model."""
+        from .models.detection_benchmark import run_benchmark
+        result = run_benchmark(images, onnx or app.config['DETECTION_ONNX_PATH'], batch_size=batch_size,
+                               repeat=repeat, threads=app.config.get('DETECTION_THREADS'))
+        for name in ('torch', 'onnx'):
+            stats = result[name]
+            print(f"{name:<6} {stats['images_per_second']:>8} img/s  p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms")
+        print(f"parity {result['parity']}")
+        if result['parity']['recall'] < min_recall:
+            raise SystemExit(1)
+
+    @app.cli.command('llm-stub')
+    @click.option('--port', default=8081, help='Port to listen on')
+    @click.option('--delay', default=0.0, help='Seconds to wait before each answer')
+    @click.option('--fail-every', default=0, help='Answer every Nth request with an error (0 never)')
+    def llm_stub_command(port, delay, fail_every):
+        """Serve a local stand-in for the OpenAI completions API."""
+        from .models.llm_stub import serve
+        print(f'Stub LLM on http://127.0.0.1:{port}/v1, set OPENAI_API_BASE to use it')
+        serve(port=port, delay=delay, fail_every=fail_every)
+
+    @app.cli.command('audit-queries')
+    @click.option('--database', default='sqlite:///query_audit.db', help='Scratch database URL to seed and audit')
+    @click.option('--invoices', default=100000, help='Number of synthetic invoices to seed')
+    @click.option('--no-seed', is_flag=True, help='Audit the existing data without reseeding')
+    @click.option('--repeat', default=5, help='Timed runs per query')
+    def audit_queries_command(database, invoices, no_seed, repeat):
+        """Seed synthetic data and check that hot queries use an index."""
+        from .models.query_audit import run_audit
+        results = run_audit(database, invoices=invoices, reseed=not no_seed, repeat=repeat)
+        for result in results:
+            status = 'ok  ' if result['uses_index'] else 'SCAN'
+            print(f"{status} {result['query']:<48} {result['median_ms']:>10} ms")
+            for line in result['plan']:
+                print(f'       {line}')
+        if not all(result['uses_index'] for result in results):
+            raise SystemExit(1)
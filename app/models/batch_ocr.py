@@ -0,0 +1,83 @@
+import numpy as np
+import fitz  # PyMuPDF
+from .reader_pool import reader_pool
+from .preprocessing import load_image, ocr_pipeline
+
+PDF_DPI = 200
+BATCH_SIZE = 8
+
+
+def init_app(app):
+    global PDF_DPI, BATCH_SIZE
+    PDF_DPI = app.config.get('OCR_PDF_DPI', PDF_DPI)
+    BATCH_SIZE = app.config.get('OCR_BATCH_SIZE', BATCH_SIZE)
+
+def is_pdf(path):
+    return path.lower().endswith('.pdf')
+
+def rasterize_pdf(pdf_path, dpi=None):
+    # Render every page to a BGR array, the same layout cv2.imread returns
+    pages = []
+    zoom = (dpi or PDF_DPI) / 72.0
+    with fitz.open(pdf_path) as pdf:
+        for page in pdf:
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            rgb = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, 3)
+            pages.append(np.ascontiguousarray(rgb[:, :, ::-1]))
+    return pages
+
+def load_pages(path):
+    if is_pdf(path):
+        return rasterize_pdf(path)
+    return [load_image(path)]
+
+def ocr_pages(images, languages=None, batch_size=None, detail=0):
+    # Preprocess every page, then group pages of identical size so EasyOCR
+    # can run detection and recognition on each group as one batch
+    batch_size = batch_size or BATCH_SIZE
+    prepared = [ocr_pipeline.run(image, name=f'page{index}') for index, image in enumerate(images)]
+
+    groups = {}
+    for index, image in enumerate(prepared):
+        groups.setdefault(image.shape, []).append(index)
+
+    results = [None] * len(prepared)
+    with reader_pool.reader(languages or ['en', 'id']) as reader:
+        for indexes in groups.values():
+            for start in range(0, len(indexes), batch_size):
+                chunk = indexes[start:start + batch_size]
+                if len(chunk) == 1:
+                    batch_results = [reader.readtext(prepared[chunk[0]], detail=detail)]
+                else:
+                    batch_results = reader.readtext_batched([prepared[i] for i in chunk], detail=detail, batch_size=len(chunk))
+                for index, page_result in zip(chunk, batch_results):
+                    results[index] = page_result
+
+    return [
+        {
+            'page': index + 1,
+            'text': ' '.join(page_result) if detail == 0 else ' '.join(text for (_, text, _) in page_result),
+            'results': page_result
+        }
+        for index, page_result in enumerate(results)
+    ]
+
+def extract_text_from_document(path, languages=None):
+    pages = ocr_pages(load_pages(path), languages=languages)
+    return '\n'.join(page['text'] for page in pages)
+
+def extract_pages_from_files(paths, languages=None):
+    # OCR the pages of many files in one batched pass, then split them back
+    # out per file in the original order
+    images, owners = [], []
+    for path in paths:
+        for image in load_pages(path):
+            images.append(image)
+            owners.append(path)
+
+    pages = ocr_pages(images, languages=languages)
+
+    by_file = {path: [] for path in paths}
+    for path, page in zip(owners, pages):
+        by_file[path].append({'page': len(by_file[path]) + 1, 'text': page['text']})
+    return by_file
@@ -0,0 +1,115 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from symspellpy.symspellpy import Verbosity
+from .registry import registry
+
+# Only alphabetic runs are corrected; numbers, prices and punctuation are
+# left exactly where they are. Apostrophes and hyphens stay inside a word
+# so "don't" or "e-mail" are never split into one-letter pieces.
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['\u2019-][^\W\d_]+)*")
+# Shorter words and contractions/compounds are too ambiguous for an edit
+# distance lookup and are left unchanged
+MIN_WORD_LENGTH = 3
+
+SYMSPELL_MODELS = {
+    'en': 'symspell_en',
+    'id': 'symspell_id',
+}
+
+
+# LRU cache of corrected tokens shared by every request in the worker.
+# OCR output repeats header words, units and product names constantly,
+# so most lookups are answered here without touching SymSpell.
+class CorrectionCache:
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'tokens': 0, 'unique_tokens': 0, 'hits': 0, 'misses': 0, 'seconds': 0.0}
+
+    def init_app(self, app):
+        self.max_size = app.config.get('CORRECTION_CACHE_SIZE', self.max_size)
+
+    def get_many(self, language, tokens):
+        found = {}
+        with self._lock:
+            for token in tokens:
+                key = (language, token)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[token] = self._entries[key]
+        return found
+
+    def put_many(self, language, corrections):
+        with self._lock:
+            for token, corrected in corrections.items():
+                self._entries[(language, token)] = corrected
+                self._entries.move_to_end((language, token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record(self, tokens, unique_tokens, hits, seconds):
+        with self._lock:
+            self._stats['tokens'] += tokens
+            self._stats['unique_tokens'] += unique_tokens
+            self._stats['hits'] += hits
+            self._stats['misses'] += unique_tokens - hits
+            self._stats['seconds'] += seconds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['tokens_per_second'] = round(stats['tokens'] / stats['seconds']) if stats['seconds'] else None
+        stats['seconds'] = round(stats['seconds'], 3)
+        return stats
+
+
+correction_cache = CorrectionCache()
+
+
+def match_case(original, corrected):
+    # Retain original casing
+    if original.isupper() and len(original) > 1:
+        return corrected.upper()
+    if original.istitle():
+        return corrected.capitalize()
+    return corrected
+
+def correctable(token):
+    return len(token) >= MIN_WORD_LENGTH and token.isalpha()
+
+def correct_tokens(tokens, language, max_edit_distance=2):
+    # Deduplicate first so each distinct word is looked up at most once per
+    # document, then consult the shared cache before SymSpell
+    unique = list(dict.fromkeys(token.lower() for token in tokens))
+    corrections = {token: token for token in unique if not correctable(token)}
+    corrections.update(correction_cache.get_many(language, [token for token in unique if correctable(token)]))
+    # Hits are the words answered without a SymSpell lookup
+    hits = len(corrections)
+
+    missing = [token for token in unique if token not in corrections]
+    if missing:
+        symspell = registry.get(SYMSPELL_MODELS[language])
+        looked_up = {}
+        for token in missing:
+            suggestions = symspell.lookup(token, Verbosity.TOP, max_edit_distance=max_edit_distance, include_unknown=True)
+            looked_up[token] = suggestions[0].term if suggestions else token
+        correction_cache.put_many(language, looked_up)
+        corrections.update(looked_up)
+
+    return corrections, len(unique), hits
+
+def correct_document(text, language):
+    # Load the dictionary first so its one-off load time does not count
+    # towards tokens_per_second
+    registry.get(SYMSPELL_MODELS[language])
+    start = time.perf_counter()
+    words = WORD_PATTERN.findall(text)
+    corrections, unique_count, hits = correct_tokens(words, language)
+
+    corrected = WORD_PATTERN.sub(lambda match: match_case(match.group(0), corrections[match.group(0).lower()]), text)
+    correction_cache.record(len(words), unique_count, hits, time.perf_counter() - start)
+    return corrected
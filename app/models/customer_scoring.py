@@ -0,0 +1,161 @@
+import os
+import uuid
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import joblib
+from sqlalchemy import select, func, distinct
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+from sklearn.metrics import mean_squared_error, accuracy_score
+from .db import db, Invoice, InvoiceItem
+from .features import FEATURE_COLUMNS, feature_matrix
+from .rollups import as_date
+
+FEATURES = FEATURE_COLUMNS[1:]
+LATEST = 'LATEST'
+
+
+def _customer_totals(start_date, end_date, organization_id):
+    query = select(
+        Invoice.customer_id,
+        func.max(Invoice.date),
+        func.count(distinct(Invoice.id)),
+        func.coalesce(func.sum(InvoiceItem.qty * InvoiceItem.unit_price), 0),
+    ).select_from(Invoice).outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id).where(
+        Invoice.customer_id.isnot(None), Invoice.date.isnot(None)
+    )
+    if start_date:
+        query = query.where(Invoice.date >= start_date)
+    query = query.where(Invoice.date < end_date)
+    if organization_id is not None:
+        query = query.where(Invoice.organization_id == organization_id)
+    rows = db.session.execute(query.group_by(Invoice.customer_id)).all()
+    return pd.DataFrame.from_records(rows, columns=['CustomerID', 'LastPurchase', 'Frequency', 'Monetary'])
+
+def training_frame(cutoff, horizon_days=180, organization_id=None):
+    # RFM as it stood at cutoff, labelled with what each customer did in the
+    # following horizon: CLV is the revenue, Churn means no invoice at all
+    cutoff = as_date(cutoff)
+    past = _customer_totals(None, cutoff, organization_id)
+    future = _customer_totals(cutoff, cutoff + timedelta(days=horizon_days), organization_id)
+
+    frame = past.merge(future[['CustomerID', 'Frequency', 'Monetary']], on='CustomerID', how='left', suffixes=('', 'Future'))
+    frame['Recency'] = (pd.Timestamp(cutoff) - pd.to_datetime(frame['LastPurchase'])).dt.days
+    frame['Frequency'] = frame['Frequency'].astype(np.int64)
+    frame['Monetary'] = frame['Monetary'].astype(np.float64)
+    frame['CLV'] = frame['MonetaryFuture'].fillna(0).astype(np.float64)
+    frame['Churn'] = frame['FrequencyFuture'].fillna(0).eq(0).astype(np.int64)
+    return frame[FEATURE_COLUMNS + ['CLV', 'Churn']]
+
+def fit_models(customers_df, n_jobs=-1):
+    # Expects Recency, Frequency, Monetary, CLV and Churn columns. Returns
+    # both estimators fitted on every row plus holdout metrics.
+    X = customers_df[FEATURES].to_numpy(dtype=np.float64)
+    clv = customers_df['CLV'].to_numpy(dtype=np.float64)
+    churn = customers_df['Churn'].to_numpy(dtype=np.int64)
+
+    X_train, X_test, clv_train, clv_test, churn_train, churn_test = train_test_split(
+        X, clv, churn, test_size=0.2, random_state=42
+    )
+    clv_model = RandomForestRegressor(random_state=42, n_jobs=n_jobs).fit(X_train, clv_train)
+    churn_model = RandomForestClassifier(random_state=42, n_jobs=n_jobs).fit(X_train, churn_train)
+    metrics = {
+        'customers': len(X),
+        'clv_mse': float(mean_squared_error(clv_test, clv_model.predict(X_test))),
+        'churn_accuracy': float(accuracy_score(churn_test, churn_model.predict(X_test))),
+    }
+
+    # Refit on everything for the artifact that gets served
+    clv_model.fit(X, clv)
+    churn_model.fit(X, churn)
+    return clv_model, churn_model, metrics
+
+
+# Serves CLV and churn scores from the latest trained artifact. Training is
+# offline (`flask train-customer-models`); artifacts are versioned joblib
+# files written uncompressed so their arrays can be memory-mapped.
+class CustomerScorer:
+    def __init__(self, artifact_dir='models/customer_scoring', batch_size=10000):
+        self.artifact_dir = artifact_dir
+        self.batch_size = batch_size
+        self._artifact = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.artifact_dir = os.path.join(app.config.get('MODEL_ARTIFACT_DIR', 'models'), 'customer_scoring')
+        self.batch_size = app.config.get('SCORING_BATCH_SIZE', self.batch_size)
+
+    def train(self, customers_df, n_jobs=-1):
+        clv_model, churn_model, metrics = fit_models(customers_df, n_jobs=n_jobs)
+        # Sorts by training time; the random suffix keeps two trainings in
+        # the same microsecond, or on two hosts, from sharing a file
+        version = f"{datetime.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        artifact = {'version': version, 'features': FEATURES, 'metrics': metrics,
+                    'clv': clv_model, 'churn': churn_model}
+
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        joblib.dump(artifact, os.path.join(self.artifact_dir, f'{version}.joblib'))
+        tmp_path = os.path.join(self.artifact_dir, f'{LATEST}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.artifact_dir, LATEST))
+        return version, metrics
+
+    def latest_version(self):
+        try:
+            with open(os.path.join(self.artifact_dir, LATEST)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def artifact(self):
+        # Loaded once per worker and swapped when a newer version appears
+        version = self.latest_version()
+        if version is None:
+            raise LookupError('No customer scoring model has been trained')
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    artifact = joblib.load(os.path.join(self.artifact_dir, f'{version}.joblib'), mmap_mode='r')
+                    # Small requests are faster without thread fan-out
+                    artifact['clv'].n_jobs = 1
+                    artifact['churn'].n_jobs = 1
+                    self._artifact, self._version = artifact, version
+        return self._artifact
+
+    def predict(self, features):
+        # features is a (customers, 3) Recency/Frequency/Monetary array
+        artifact = self.artifact()
+        clv = np.empty(len(features))
+        churn = np.empty(len(features))
+        positive = list(artifact['churn'].classes_).index(1) if 1 in artifact['churn'].classes_ else None
+        for start in range(0, len(features), self.batch_size):
+            batch = features[start:start + self.batch_size]
+            clv[start:start + len(batch)] = artifact['clv'].predict(batch)
+            churn[start:start + len(batch)] = (artifact['churn'].predict_proba(batch)[:, positive]
+                                               if positive is not None else 0.0)
+        return clv, churn
+
+    def score(self, customer_ids=None, organization_id=None):
+        ids, features = feature_matrix(organization_id, customer_ids=customer_ids)
+        if not len(ids):
+            return []
+        clv, churn = self.predict(features)
+        return [
+            {'customer_id': int(customer_id), 'clv': round(float(value), 2), 'churn_probability': round(float(probability), 4)}
+            for customer_id, value, probability in zip(ids, clv, churn)
+        ]
+
+    def stats(self):
+        artifact = self._artifact
+        return {
+            'version': self._version,
+            'latest_version': self.latest_version(),
+            'metrics': artifact['metrics'] if artifact else None
+        }
+
+
+customer_scorer = CustomerScorer()
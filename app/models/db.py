@@ -1,5 +1,8 @@
 from datetime import datetime
+from sqlalchemy.orm import defer
 from .. import db
+from .pagination import encode_cursor, after_cursor
+from .serializer import serialize_object
 
 
 class Document(db.Model):
@@ -10,14 +13,25 @@ class Document(db.Model):
     labeled_text = db.Column(db.Text, nullable=True)
     manual_corrected_text = db.Column(db.Text, nullable=True)
     doc_type = db.Column(db.String(50), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default='done')  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_document_created_at_id', 'created_at', 'id'),
+        db.Index('ix_document_doc_type_created_at', 'doc_type', 'created_at'),
+    )
         
     def __repr__(self):
         return f'<Document {self.filename}>'
 
+    # Large text blobs, only loaded when a caller asks for them
+    TEXT_COLUMNS = ('text', 'corrected_text', 'labeled_text', 'manual_corrected_text')
+
     @staticmethod
-    def get_documents(start_date=None, end_date=None, doc_type=None, manual_corrected_only=True):
-        query = Document.query
+    def filter_documents(query, start_date=None, end_date=None, doc_type=None, manual_corrected_only=True):
         if start_date:
             query = query.filter(Document.created_at >= start_date)
         if end_date:
@@ -26,7 +40,45 @@ class Document(db.Model):
             query = query.filter(Document.doc_type == doc_type)
         if manual_corrected_only:
             query = query.filter(Document.manual_corrected_text != None)  
-        return query.all()
+        return query
+
+    @staticmethod
+    def get_documents(start_date=None, end_date=None, doc_type=None, manual_corrected_only=True):
+        return Document.filter_documents(Document.query, start_date, end_date, doc_type, manual_corrected_only).all()
+
+    @staticmethod
+    def page_documents(cursor=None, limit=50, start_date=None, end_date=None, doc_type=None,
+                       manual_corrected_only=False, include_text=False):
+        # Keyset pagination on (created_at, id), newest first. Returns the
+        # page and the cursor for the next one (None on the last page).
+        query = Document.filter_documents(Document.query, start_date, end_date, doc_type, manual_corrected_only)
+        if not include_text:
+            query = query.options(*[defer(getattr(Document, column)) for column in Document.TEXT_COLUMNS])
+        if cursor:
+            query = after_cursor(query, Document.created_at, Document.id, cursor)
+
+        # created_at NULLs sort last in both SQLite and MySQL descending order
+        documents = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            last = documents[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return documents, next_cursor
+
+    def serialize(self, include_text=False):
+        data = {
+            'id': self.id,
+            'filename': self.filename,
+            'doc_type': self.doc_type,
+            'status': self.status,
+            'content_hash': self.content_hash,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
+        if include_text:
+            for column in Document.TEXT_COLUMNS:
+                data[column] = getattr(self, column)
+        return data
         
         
 class Organization(db.Model):
@@ -49,22 +101,16 @@ class Customer(db.Model):
     city = db.Column(db.String(100))
     zip = db.Column(db.String(7))
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        # name first so lookups by name alone can use it too
+        db.Index('ix_customer_name_organization_id', 'name', 'organization_id'),
+        db.Index('ix_customer_organization_id', 'organization_id'),
+    )
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
     def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'phone': self.phone,
-            'email': self.email,
-            'address': self.address,
-            'city': self.city,
-            'zip': self.zip,
-            'organization_id': self.organization_id,
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self)
         
 class Supplier(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -75,6 +121,9 @@ class Supplier(db.Model):
     city = db.Column(db.String(100))
     zip = db.Column(db.String(7))
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_supplier_organization_id_name', 'organization_id', 'name'),
+    )
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
@@ -92,21 +141,13 @@ class Product(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        # name first so lookups by name alone can use it too
+        db.Index('ix_product_name_organization_id', 'name', 'organization_id'),
+        db.Index('ix_product_organization_id', 'organization_id'),
+    )
     def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'unit_price': str(self.unit_price),
-            'unit': self.unit,
-            'unit_sale': self.unit_sale,
-            'selling_price': str(self.selling_price),
-            'purchase_price': str(self.purchase_price),
-            'stock_onhand': self.stock_onhand,
-            'stock_reorder': self.stock_reorder,
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
 
 class ProductImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -116,14 +157,7 @@ class ProductImage(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     def serialize(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'image': self.image,
-            'imagepath': str(self.imagepath),
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self)
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date)
@@ -136,20 +170,14 @@ class Invoice(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_invoice_organization_id_date', 'organization_id', 'date'),
+        db.Index('ix_invoice_date', 'date'),
+        db.Index('ix_invoice_customer_id', 'customer_id'),
+    )
     
     def serialize(self):
-        return {
-            'id': self.id,
-            'date': self.date.strftime('%Y-%m-%d'),
-            'customer_id': self.customer_id,
-            'subtotal': str(self.subtotal),
-            'discount': str(self.discount),
-            'total': str(self.total),
-            'tax': str(self.tax),
-            'amount': str(self.amount),
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
 
 class InvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -166,23 +194,14 @@ class InvoiceItem(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_invoice_item_invoice_id', 'invoice_id'),
+        db.Index('ix_invoice_item_product_id', 'product_id'),
+        db.Index('ix_invoice_item_organization_id', 'organization_id'),
+    )
     
     def serialize(self):
-        return {
-            'id': self.id,
-            'invoice_id': self.invoice_id,
-            'product_id': self.product_id,
-            'qty': self.qty,
-            'unit_price': str(self.unit_price),
-            'unit_sale': self.unit_sale,
-            'subtotal': str(self.subtotal),
-            'discount': str(self.discount),
-            'total': str(self.total),
-            'tax': str(self.tax),
-            'amount': str(self.amount),
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
 
 class Purchase(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -196,19 +215,11 @@ class Purchase(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_purchase_organization_id_date', 'organization_id', 'date'),
+    )
     def serialize(self):
-        return {
-            'id': self.id,
-            'date': self.date.strftime('%Y-%m-%d'),
-            'supplier_id': self.supplier_id,
-            'subtotal': str(self.subtotal),
-            'discount': str(self.discount),
-            'total': str(self.total),
-            'tax': str(self.tax),
-            'amount': str(self.amount),
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
         
 class PurchaseItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -225,22 +236,12 @@ class PurchaseItem(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_purchase_item_purchase_id', 'purchase_id'),
+        db.Index('ix_purchase_item_organization_id', 'organization_id'),
+    )
     def serialize(self):
-        return {
-            'id': self.id,
-            'purchase_id': self.purchase_id,
-            'product_id': self.product_id,
-            'qty': self.qty,
-            'unit_price': str(self.unit_price),
-            'unit_sale': self.unit_sale,
-            'subtotal': str(self.subtotal),
-            'discount': str(self.discount),
-            'total': str(self.total),
-            'tax': str(self.tax),
-            'amount': str(self.amount),
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
         
 class Issuer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -254,6 +255,9 @@ class Issuer(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_issuer_organization_id', 'organization_id'),
+    )
 
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -263,15 +267,11 @@ class Account(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_account_organization_id', 'organization_id'),
+    )
     def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'type': self.type,
-            'issuer_id': self.issuer_id,
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return serialize_object(self, exclude=('organization_id',))
 
 class AccountTransaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -285,17 +285,72 @@ class AccountTransaction(db.Model):
     created = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
     updated = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    __table_args__ = (
+        db.Index('ix_account_transaction_organization_id_date', 'organization_id', 'date'),
+        db.Index('ix_account_transaction_account_id_date', 'account_id', 'date'),
+    )
     
     def serialize(self):
-        return {
-            'id': self.id,
-            'date': self.date.strftime('%Y-%m-%d'),
-            'type': self.type,
-            'description': self.description,
-            'reff': self.reff,
-            'amount': str(self.amount),
-            'account_id': self.account_id,
-            'debt_credit': self.debt_credit,
-            'created': self.created.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated': self.updated.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        return serialize_object(self, exclude=('organization_id',))
+
+
+def _key_column(column):
+    # Unique constraints treat NULLs as distinct, so nullable key columns
+    # get a non-null twin the constraint (and the upserts) can use
+    return db.Column(db.Integer, db.Computed(f'coalesce({column}, 0)', persisted=True))
+
+# Daily sales rollups, maintained incrementally by the invoice writers and
+# rebuilt with `flask rebuild-rollups`; see rollups.py
+class SalesRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    date = db.Column(db.Date, nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
+    invoices = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    organization_key = _key_column('organization_id')
+    customer_key = _key_column('customer_id')
+    __table_args__ = (
+        db.UniqueConstraint('organization_key', 'date', 'customer_key', name='uq_sales_rollup'),
+        db.Index('ix_sales_rollup_date', 'date'),
+    )
+
+class ProductSalesRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    date = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
+    invoices = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    organization_key = _key_column('organization_id')
+    product_key = _key_column('product_id')
+    customer_key = _key_column('customer_id')
+    __table_args__ = (
+        db.UniqueConstraint('organization_key', 'date', 'product_key', 'customer_key', name='uq_product_sales_rollup'),
+        db.Index('ix_product_sales_rollup_date', 'date'),
+    )
+
+class RollupCoverage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    start_date = db.Column(db.Date, nullable=True)  # None means from the first invoice
+    end_date = db.Column(db.Date, nullable=True)    # None means up to the latest invoice
+    rebuilt_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Per-customer recency/frequency/monetary inputs for the sales and marketing
+# models, maintained incrementally by the invoice writers and rebuilt with
+# `flask rebuild-features`; see features.py
+class CustomerFeatures(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, unique=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    first_purchase = db.Column(db.Date, nullable=True)
+    last_purchase = db.Column(db.Date, nullable=True)
+    frequency = db.Column(db.Integer, nullable=False, default=0)
+    monetary = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_customer_features_organization_id', 'organization_id'),
+    )
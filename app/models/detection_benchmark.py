@@ -0,0 +1,78 @@
+import time
+import statistics
+from .registry import registry
+from .inference import TorchBackend, OnnxBackend
+from .object_detection import load_rgb, _percentile
+
+
+def iou(a, b):
+    left, top = max(a[0], b[0]), max(a[1], b[1])
+    right, bottom = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(right - left, 0) * max(bottom - top, 0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def parity(reference, candidate, iou_threshold=0.5):
+    # Greedily pair each reference box with the best unused candidate box of
+    # the same class; recall and precision near 1 mean the outputs agree
+    matched, ious, deltas = 0, [], []
+    reference_boxes = sum(len(boxes) for boxes in reference)
+    candidate_boxes = sum(len(boxes) for boxes in candidate)
+
+    for expected, actual in zip(reference, candidate):
+        used = set()
+        for box in expected:
+            best, best_iou = None, iou_threshold
+            for index, other in enumerate(actual):
+                if index in used or int(other[5]) != int(box[5]):
+                    continue
+                overlap = iou(box, other)
+                if overlap >= best_iou:
+                    best, best_iou = index, overlap
+            if best is not None:
+                used.add(best)
+                matched += 1
+                ious.append(best_iou)
+                deltas.append(abs(float(box[4]) - float(actual[best][4])))
+
+    return {
+        'reference_boxes': reference_boxes,
+        'candidate_boxes': candidate_boxes,
+        'recall': round(matched / reference_boxes, 4) if reference_boxes else 1.0,
+        'precision': round(matched / candidate_boxes, 4) if candidate_boxes else 1.0,
+        'mean_iou': round(statistics.mean(ious), 4) if ious else None,
+        'max_confidence_delta': round(max(deltas), 4) if deltas else None
+    }
+
+def throughput(backend, images, batch_size=8, repeat=3):
+    # One untimed batch first so lazy initialization is not measured
+    backend.predict(images[:batch_size])
+
+    latencies, total_seconds, detections = [], 0.0, None
+    for _ in range(repeat):
+        detections = []
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            began = time.perf_counter()
+            detections.extend(backend.predict(batch))
+            seconds = time.perf_counter() - began
+            total_seconds += seconds
+            latencies.append(seconds / len(batch))
+
+    return detections, {
+        'backend': backend.name,
+        'images_per_second': round(len(images) * repeat / total_seconds, 2),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2)
+    }
+
+def run_benchmark(image_paths, onnx_path, batch_size=8, repeat=3, threads=None):
+    images = [load_rgb(path) for path in image_paths]
+    reference, torch_stats = throughput(TorchBackend(registry.get('detector')), images, batch_size, repeat)
+    candidate, onnx_stats = throughput(OnnxBackend(onnx_path, threads=threads), images, batch_size, repeat)
+    return {
+        'images': len(images),
+        'torch': torch_stats,
+        'onnx': onnx_stats,
+        'parity': parity(reference, candidate)
+    }
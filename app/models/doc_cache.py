@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def upload_path(upload_folder, content_hash, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(upload_folder, content_hash[:2], content_hash + ext)
+
+def save_upload(file, upload_folder):
+    # Store the upload under its SHA-256 so identical files share one copy
+    # and same-named files from different users never overwrite each other
+    os.makedirs(upload_folder, exist_ok=True)
+    digest = hashlib.sha256()
+
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    with os.fdopen(fd, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            out.write(chunk)
+
+    content_hash = digest.hexdigest()
+    file_path = upload_path(upload_folder, content_hash, file.filename)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    if os.path.exists(file_path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, file_path)
+
+    return content_hash, file_path
+
+
+# Disk cache of OCR, correction and label results keyed by content hash.
+# Entries are small JSON files; the least recently used ones are evicted
+# once the directory grows past max_bytes.
+class ResultCache:
+    def __init__(self, cache_dir='ocr_cache', max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def init_app(self, app):
+        self.cache_dir = app.config.get('OCR_CACHE_DIR', self.cache_dir)
+        self.max_bytes = app.config.get('OCR_CACHE_MAX_BYTES', self.max_bytes)
+
+    def _path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], content_hash + '.json')
+
+    def get(self, content_hash):
+        path = self._path(content_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so eviction treats it as recently used; it may
+        # have been evicted since it was read, which is fine
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return result
+
+    def put(self, content_hash, result):
+        path = self._path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(result).encode('utf-8')
+
+        with self._lock:
+            size = self._current_size()
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = path + '.part'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._size = size + len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under 90% of
+        # the limit, so a burst of inserts does not rescan on every put
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(self._entries()):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            'cache_dir': self.cache_dir,
+            'max_bytes': self.max_bytes,
+            'size_bytes': self._current_size()
+        }
+
+
+result_cache = ResultCache()
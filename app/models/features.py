@@ -0,0 +1,108 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, distinct, case, or_
+from .db import db, Invoice, InvoiceItem, CustomerFeatures
+from .rollups import as_date, _money, upsert
+
+# Column names the sales and marketing models expect
+FEATURE_COLUMNS = ['CustomerID', 'Recency', 'Frequency', 'Monetary']
+
+
+def record_customer_features(invoices, items):
+    # Fold newly written invoices into the per-customer RFM features, inside
+    # the caller's transaction like rollups.record_invoices
+    by_id = {invoice.id: invoice for invoice in invoices}
+    totals = defaultdict(lambda: {'invoices': 0, 'monetary': Decimal(0), 'first': None, 'last': None, 'organization_id': None})
+
+    for invoice in invoices:
+        if invoice.customer_id is None or invoice.date is None:
+            continue
+        day = as_date(invoice.date)
+        customer = totals[invoice.customer_id]
+        customer['invoices'] += 1
+        customer['first'] = day if customer['first'] is None else min(customer['first'], day)
+        customer['last'] = day if customer['last'] is None else max(customer['last'], day)
+        customer['organization_id'] = invoice.organization_id
+
+    for item in items:
+        invoice = by_id[item['invoice_id']]
+        if invoice.customer_id in totals:
+            totals[invoice.customer_id]['monetary'] += (item.get('qty') or 0) * _money(item.get('unit_price'))
+
+    rows = [{
+        'customer_id': customer_id,
+        'organization_id': customer['organization_id'],
+        'first_purchase': customer['first'],
+        'last_purchase': customer['last'],
+        'frequency': customer['invoices'],
+        'monetary': customer['monetary']
+    } for customer_id, customer in sorted(totals.items())]
+
+    # Upserted on the unique customer_id with additive updates, so concurrent
+    # writers do not lose each other's invoices; dates only ever widen
+    upsert(CustomerFeatures, rows, ('customer_id',), lambda new: {
+        'frequency': CustomerFeatures.frequency + new.frequency,
+        'monetary': CustomerFeatures.monetary + new.monetary,
+        'first_purchase': case(
+            (or_(CustomerFeatures.first_purchase.is_(None), CustomerFeatures.first_purchase > new.first_purchase), new.first_purchase),
+            else_=CustomerFeatures.first_purchase
+        ),
+        'last_purchase': case(
+            (or_(CustomerFeatures.last_purchase.is_(None), CustomerFeatures.last_purchase < new.last_purchase), new.last_purchase),
+            else_=CustomerFeatures.last_purchase
+        ),
+    })
+
+
+def _features_source():
+    return select(
+        Invoice.customer_id,
+        func.max(Invoice.organization_id),
+        func.min(Invoice.date),
+        func.max(Invoice.date),
+        func.count(distinct(Invoice.id)),
+        func.coalesce(func.sum(InvoiceItem.qty * InvoiceItem.unit_price), 0),
+    ).select_from(Invoice).outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id).where(
+        Invoice.customer_id.isnot(None), Invoice.date.isnot(None)
+    ).group_by(Invoice.customer_id)
+
+def rebuild_customer_features():
+    # Backfill every customer in one INSERT ... SELECT; the aggregation runs
+    # in the database and no invoice rows are loaded into Python
+    try:
+        db.session.query(CustomerFeatures).delete(synchronize_session=False)
+        db.session.execute(CustomerFeatures.__table__.insert().from_select(
+            ['customer_id', 'organization_id', 'first_purchase', 'last_purchase', 'frequency', 'monetary'],
+            _features_source()
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def load_features(organization_id=None, as_of=None, customer_ids=None):
+    # RFM frame for the models. Recency is counted in days up to as_of
+    # (today by default), so it never goes stale in the table.
+    query = select(CustomerFeatures.customer_id, CustomerFeatures.last_purchase,
+                   CustomerFeatures.frequency, CustomerFeatures.monetary)
+    if organization_id is not None:
+        query = query.where(CustomerFeatures.organization_id == organization_id)
+    if customer_ids is not None:
+        query = query.where(CustomerFeatures.customer_id.in_(list(customer_ids)))
+
+    rows = db.session.execute(query).all()
+    frame = pd.DataFrame.from_records(rows, columns=['CustomerID', 'LastPurchase', 'Frequency', 'Monetary'])
+    as_of = pd.Timestamp(as_of or date.today())
+    frame['Recency'] = (as_of - pd.to_datetime(frame['LastPurchase'])).dt.days
+    frame['Frequency'] = frame['Frequency'].astype(np.int64)
+    frame['Monetary'] = frame['Monetary'].astype(np.float64)
+    return frame[FEATURE_COLUMNS]
+
+def feature_matrix(organization_id=None, as_of=None, customer_ids=None):
+    # Customer ids and a float (customers, 3) Recency/Frequency/Monetary array
+    frame = load_features(organization_id, as_of, customer_ids)
+    return frame['CustomerID'].to_numpy(), frame[FEATURE_COLUMNS[1:]].to_numpy(dtype=np.float64)
@@ -1,40 +1,33 @@
 import os
 import cv2
-import easyocr
-import torch
-from ultralytics import YOLO
-
-# Initialize YOLO model (assuming YOLOv8 with COCO dataset or a custom trained model)
-model = YOLO('yolov8n.pt')  # Use the correct model path
-
-# Initialize EasyOCR
-reader = easyocr.Reader(['en','id'])
+from .reader_pool import reader_pool
+from .object_detection import detection_service, load_rgb
+from .region_ocr import read_regions
 
 def extract_text_from_image_po(image_path):
     # Read the image using OpenCV
     image = cv2.imread(image_path)
 
     # Use EasyOCR to extract text
-    result = reader.readtext(image)
+    with reader_pool.reader(['en', 'id']) as reader:
+        result = reader.readtext(image)
     extracted_text = ' '.join([text for (_, text, _) in result])
 
     return extracted_text
 
 def detect_objects_in_image(image_path):
-    # Perform object detection
-    results = model(image_path)
-    
-    # Process results
-    detections = []
-    for result in results.xyxy[0]:
-        xmin, ymin, xmax, ymax, confidence, class_id = result
-        detections.append({
-            'bounding_box': [xmin.item(), ymin.item(), xmax.item(), ymax.item()],
-            'confidence': confidence.item(),
-            'class_id': int(class_id.item())
-        })
-
-    return detections
+    # Same detector and result type as item scanning; labels and text on
+    # each detected package are read from its box directly
+    image = load_rgb(image_path)
+    detections = detection_service.detect([image])[0]
+    texts = read_regions([image], [detections])[0]
+
+    results = []
+    for detection, text in zip(detections, texts):
+        result = detection.serialize()
+        result['text'] = text[0] if text else None
+        results.append(result)
+    return results
 
 def verify_goods_receipt(image_path, expected_items):
     # Extract text from the image (delivery document)
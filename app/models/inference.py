@@ -0,0 +1,139 @@
+import json
+import os
+import cv2
+import numpy as np
+
+# Detection defaults shared by every backend so they filter the same way
+INPUT_SIZE = 640
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 1000
+
+
+# Inference backends take a list of RGB arrays and return one (n, 6) array
+# per image with rows of left, top, right, bottom, confidence, class_id:
+# the rows YOLOv5 gave through results.xyxy and ultralytics through boxes.data.
+class TorchBackend:
+    name = 'torch'
+
+    def __init__(self, model):
+        self.model = model
+        self.names = model.names
+
+    def predict(self, images):
+        # ultralytics reads numpy arrays as BGR
+        results = self.model([cv2.cvtColor(image, cv2.COLOR_RGB2BGR) for image in images],
+                             conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, max_det=MAX_DETECTIONS, verbose=False)
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, path, threads=None, providers=None):
+        import onnxruntime
+
+        # Class names and input size are stored next to the model on export
+        with open(metadata_path(path)) as f:
+            metadata = json.load(f)
+        self.names = {int(key): value for key, value in metadata['names'].items()}
+        self.input_size = metadata.get('input_size', INPUT_SIZE)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        # e.g. ['OpenVINOExecutionProvider', 'CPUExecutionProvider'] when
+        # onnxruntime-openvino is installed
+        self.session = onnxruntime.InferenceSession(path, options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, images):
+        inputs, transforms = [], []
+        for image in images:
+            letterboxed, transform = letterbox(image, self.input_size)
+            inputs.append(letterboxed)
+            transforms.append(transform)
+
+        batch = np.ascontiguousarray(np.stack(inputs).transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return [postprocess(output, transform, image.shape[:2])
+                for output, transform, image in zip(outputs, transforms, images)]
+
+
+def metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def letterbox(image, size=INPUT_SIZE):
+    # Resize keeping the aspect ratio and pad to size x size with grey,
+    # as YOLO does before inference
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized_height, resized_width = int(round(height * scale)), int(round(width * scale))
+    resized = cv2.resize(image, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+
+    top = (size - resized_height) // 2
+    left = (size - resized_width) // 2
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    padded[top:top + resized_height, left:left + resized_width] = resized
+    return padded, (scale, left, top)
+
+def postprocess(output, transform, shape, conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD):
+    # YOLOv5 exports (anchors, 5 + classes) with an objectness column;
+    # YOLOv8 exports (4 + classes, anchors) without one
+    if output.shape[0] < output.shape[1]:
+        output = output.T
+        boxes, scores = output[:, :4], output[:, 4:]
+    else:
+        boxes, scores = output[:, :4], output[:, 5:] * output[:, 4:5]
+
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences > conf_threshold
+    boxes, confidences, class_ids = boxes[keep], confidences[keep], class_ids[keep]
+    if not len(boxes):
+        return np.zeros((0, 6), dtype=np.float32)
+
+    # Center x, y, width, height to corners
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+    # Per-class NMS: offsetting each class keeps boxes of different classes
+    # from suppressing each other
+    offsets = class_ids[:, None].astype(np.float32) * 4096
+    shifted = xyxy + offsets
+    rects = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+    indices = cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf_threshold, iou_threshold)
+    indices = np.array(indices).reshape(-1)[:MAX_DETECTIONS]
+
+    # Undo the letterbox and clip to the original image
+    scale, left, top = transform
+    height, width = shape
+    xyxy = (xyxy[indices] - [left, top, left, top]) / scale
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+
+    detections = np.concatenate([xyxy, confidences[indices, None], class_ids[indices, None]], axis=1)
+    return detections[np.argsort(-detections[:, 4])].astype(np.float32)
+
+
+def export_onnx(model, path, input_size=INPUT_SIZE, int8=False):
+    # Export an ultralytics model with a dynamic batch axis; int8
+    # additionally writes a dynamically quantized copy
+    import shutil
+
+    exported = model.export(format='onnx', imgsz=input_size, dynamic=True)
+    shutil.move(exported, path)
+    metadata = {'names': {str(key): value for key, value in model.names.items()}, 'input_size': input_size}
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f)
+
+    if not int8:
+        return path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.splitext(path)[0] + '.int8.onnx'
+    quantize_dynamic(path, int8_path, weight_type=QuantType.QUInt8)
+    with open(metadata_path(int8_path), 'w') as f:
+        json.dump(metadata, f)
+    return int8_path
@@ -0,0 +1,250 @@
+import re
+import threading
+
+# Declarative catalog of invoice fields. Each field lists its label
+# variants in priority order; adding a supplier layout is one more entry
+# here rather than another pass over the text.
+FIELD_PATTERNS = {
+    'invoice_number': {
+        'flags': 'i',
+        'patterns': [
+            r'Invoice\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+            r'INV\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+            r'No\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+            r'Nomor\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+            r'Nota\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+            r'Faktur\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        ],
+    },
+    'date': {
+        'patterns': [
+            r'Date\s*[\s:#-]*\s*(\S+)',
+            r'Tanggal\s*[\s:#-]*\s*(\S+)',
+        ],
+    },
+    'subtotal': {
+        'patterns': [r'Subtotal\s*[:#-]*\s*\$?([\d.]+)'],
+    },
+    'total': {
+        'patterns': [r'(?:Total|Jumlah)\s*[:#-]*\s*\$?([\d.]+)'],
+    },
+    'customer_name': {
+        'patterns': [r'(?:Customer|To|Kepada)\s*[:]*\s*(.+)'],
+    },
+    'customer_address': {
+        'patterns': [r'(?:Address|Ship|Alamat)\s*[:]*\s*(.+)'],
+    },
+    'customer_phone': {
+        'patterns': [r'(?:Phone|Telp)\s*[:]*\s*(\S+)'],
+    },
+    'product': {
+        'multiple': True,
+        'patterns': [r'(\d+)\s+([^0-9]+)\s+(\d{1,3}(?:,\d{3})*\.\d{2})\s+(\d{1,3}(?:,\d{3})*\.\d{2})'],
+    },
+}
+
+
+# A leading word or (?:word|word) group not followed by a quantifier
+LEADING_LABEL = re.compile(r'([A-Za-z]+)(?![?*+{])')
+LABEL_GROUP = re.compile(r'\(\?:([A-Za-z|]+)\)(?![?*+{])')
+
+
+def alternatives(pattern):
+    # Split on the | characters that are not inside a group, a character
+    # class or an escape
+    parts, depth, in_class, escaped, start = [], 0, False, False, 0
+    for i, char in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            parts.append(pattern[start:i])
+            start = i + 1
+    parts.append(pattern[start:])
+    return parts
+
+def labels(pattern):
+    # The literal words every match has to start with ('Total', 'Jumlah',
+    # ...), one or more per top-level alternative, or None when some
+    # alternative starts with something else and the pattern must always run
+    found = []
+    for alternative in alternatives(pattern):
+        group = LABEL_GROUP.match(alternative)
+        word = LEADING_LABEL.match(alternative)
+        if group:
+            found.extend(group.group(1).split('|'))
+        elif word:
+            found.append(word.group(1))
+        else:
+            return None
+    return found if all(found) else None
+
+def _trie_pattern(words):
+    # Alternation factored by common prefix, so matching at a position costs
+    # the length of a label rather than the number of labels. Longer labels
+    # are tried first, so the longest label at each position is reported.
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+# Extraction is driven by the labels the patterns start with. One scan over
+# the document with a single combined label pattern finds every position
+# where any label of the catalog occurs. Each pattern is then only tried
+# at the positions of its own labels, first position first, which returns
+# exactly what re.search/finditer would. Regex work therefore grows with the
+# labels a document contains, not with the size of the catalog. Patterns
+# without a literal label (like product lines) are still searched in full.
+class FieldExtractor:
+    def __init__(self, fields):
+        self.fields = {name: dict(spec, patterns=list(spec['patterns'])) for name, spec in fields.items()}
+        self._lock = threading.Lock()
+        self._compiled = None
+
+    def register(self, field, pattern, flags='', multiple=False):
+        with self._lock:
+            spec = self.fields.setdefault(field, {'patterns': [], 'flags': flags, 'multiple': multiple})
+            spec['patterns'].append(pattern)
+            self._compiled = None
+
+    def _compile(self):
+        with self._lock:
+            if self._compiled is not None:
+                return self._compiled
+
+            # field -> [(rank, regex, label keys)]; a key is (label, ignore
+            # case) with case-insensitive labels lowered, None = no labels
+            fields = {}
+            keys = set()
+            for field, spec in self.fields.items():
+                ignore_case = 'i' in spec.get('flags', '')
+                fields[field] = []
+                for rank, pattern in enumerate(spec['patterns']):
+                    pattern_labels = labels(pattern)
+                    pattern_keys = None if pattern_labels is None else [
+                        (label.lower() if ignore_case else label, ignore_case) for label in pattern_labels
+                    ]
+                    keys.update(pattern_keys or [])
+                    fields[field].append((rank, re.compile(pattern, re.IGNORECASE if ignore_case else 0), pattern_keys))
+
+            # Every label at a position is a prefix of the longest one found
+            # there, so each lowered label maps to the keys it implies
+            lowered = {label.lower() for label, _ in keys}
+            implied = {
+                word: [(label, ignore_case) for label, ignore_case in keys if word.startswith(label.lower())]
+                for word in lowered
+            }
+            # Labels are ASCII words, so ASCII case folding is enough; the
+            # Kelvin sign and long s that Unicode folding also accepts are
+            # not taken as label letters
+            scanner = re.compile(f'(?=({_trie_pattern(lowered)}))', re.IGNORECASE | re.ASCII) if lowered else None
+            self._compiled = (fields, scanner, implied)
+            return self._compiled
+
+    def _label_positions(self, text, scanner, implied):
+        positions = {}
+        if scanner is None:
+            return positions
+        for found in scanner.finditer(text):
+            word = found.group(1)
+            for label, ignore_case in implied[word.lower()]:
+                if ignore_case or word.startswith(label):
+                    positions.setdefault((label, ignore_case), []).append(found.start())
+        return positions
+
+    def extract(self, text):
+        fields, scanner, implied = self._compile()
+        positions = self._label_positions(text, scanner, implied)
+        results = {}
+
+        for field, patterns in fields.items():
+            multiple = self.fields[field].get('multiple')
+            for rank, regex, keys in patterns:
+                if keys is None:
+                    matches = regex.finditer(text) if multiple else filter(None, [regex.search(text)])
+                else:
+                    starts = sorted({start for key in keys for start in positions.get(key, ())})
+                    matches = self._matches_at(regex, text, starts, multiple)
+
+                if multiple:
+                    results.setdefault(field, []).extend(self._found(match, rank) for match in matches)
+                    continue
+
+                # First variant that matches wins, as with the ordered
+                # re.search fallbacks this replaces
+                match = next(iter(matches), None)
+                if match:
+                    results[field] = self._found(match, rank)
+                    break
+            if multiple and not results.get(field):
+                results.pop(field, None)
+        return results
+
+    @staticmethod
+    def _matches_at(regex, text, starts, multiple):
+        # A labelled match can only start where one of its labels does;
+        # trying those positions in order gives re.search's leftmost match,
+        # and skipping overlaps gives finditer's non-overlapping ones
+        matches = []
+        end = 0
+        for start in starts:
+            if start < end:
+                continue
+            match = regex.match(text, start)
+            if match:
+                matches.append(match)
+                if not multiple:
+                    break
+                end = match.end()
+        return matches
+
+    @staticmethod
+    def _found(match, rank):
+        value_groups = len(match.groups())
+        values = [match.group(i + 1) for i in range(value_groups)]
+        spans = [match.span(i + 1) for i in range(value_groups)]
+        return {
+            'value': values[0] if value_groups == 1 else values,
+            'span': spans[0] if value_groups == 1 else spans,
+            'confidence': confidence(rank),
+        }
+
+
+def confidence(rank):
+    # First listed variant is the most specific label; later ones are
+    # looser fallbacks
+    return round(max(1.0 - 0.1 * rank, 0.5), 2)
+
+
+invoice_extractor = FieldExtractor(FIELD_PATTERNS)
+
+
+def extract_invoice_fields(text):
+    if not isinstance(text, str):
+        return {}
+    return invoice_extractor.extract(text)
+
+def field_value(fields, name):
+    found = fields.get(name)
+    return found['value'] if found else None
@@ -0,0 +1,131 @@
+from datetime import datetime
+from .db import db, Customer, Product, Invoice, InvoiceItem
+from .rollups import record_invoices
+from .features import record_customer_features
+
+# Keep IN (...) lists well under the bind parameter limits of SQLite/MySQL
+IN_CHUNK_SIZE = 500
+
+
+def _chunks(items, size=IN_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _to_float(value):
+    return float(value) if value not in (None, '') else None
+
+def _to_date(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+def product_name(product_data):
+    return product_data.get('name') or product_data.get('description')
+
+def _resolve(model, names, organization_id, build):
+    # Fetch every existing row for the given names with one query per chunk,
+    # then create the missing ones together and flush once to get their ids
+    rows = {}
+    named = [name for name in names if name is not None]
+    queries = [model.query.filter(model.name.in_(chunk)) for chunk in _chunks(named)]
+    # NULL never matches IN (...), so rows without a name need their own
+    # lookup or every save would add another nameless row
+    if len(named) < len(names):
+        queries.append(model.query.filter(model.name.is_(None)).order_by(model.id).limit(1))
+    for query in queries:
+        if organization_id is not None:
+            query = query.filter(model.organization_id == organization_id)
+        for row in query:
+            rows.setdefault(row.name, row)
+
+    missing = [build(name) for name in names if name not in rows]
+    if missing:
+        db.session.add_all(missing)
+        db.session.flush()
+        rows.update((row.name, row) for row in missing)
+    return rows
+
+# Convert the invoice fields up front so one malformed invoice is reported
+# on its own instead of aborting the transaction for all of them
+def validate_invoices(parsed_invoices):
+    valid, errors = [], []
+    for index, parsed in enumerate(parsed_invoices):
+        invoice_data = parsed['invoice']
+        try:
+            values = {
+                'date': _to_date(invoice_data.get('date')),
+                'subtotal': _to_float(invoice_data.get('subtotal')),
+                'total': _to_float(invoice_data.get('total'))
+            }
+        except (TypeError, ValueError) as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        valid.append((parsed, values))
+    return valid, errors
+
+# Persist many parsed invoices in a single transaction. Each entry is a
+# dict with 'invoice', 'customer' and 'products' keys as produced by
+# parse_invoice, parse_customer and parse_products. Returns the saved
+# invoices and the per-invoice errors of the ones that were skipped.
+def save_invoices(parsed_invoices, organization_id=None):
+    valid, errors = validate_invoices(list(parsed_invoices))
+    if not valid:
+        return [], errors
+    parsed_invoices = [parsed for parsed, _ in valid]
+
+    customer_fields = {}
+    product_prices = {}
+    for parsed in parsed_invoices:
+        customer_data = parsed['customer']
+        customer_fields.setdefault(customer_data['name'], customer_data)
+        for product_data in parsed['products']:
+            product_prices.setdefault(product_name(product_data), product_data['unit_price'])
+
+    try:
+        customers = _resolve(Customer, list(customer_fields), organization_id, lambda name: Customer(
+            name=name,
+            address=customer_fields[name].get('address'),
+            phone=customer_fields[name].get('phone'),
+            organization_id=organization_id
+        ))
+        products = _resolve(Product, list(product_prices), organization_id, lambda name: Product(
+            name=name,
+            unit_price=product_prices[name],
+            organization_id=organization_id
+        ))
+
+        invoices = []
+        for parsed, values in valid:
+            invoices.append(Invoice(
+                customer_id=customers[parsed['customer']['name']].id,
+                organization_id=organization_id,
+                **values
+            ))
+        db.session.add_all(invoices)
+        db.session.flush()
+
+        items = []
+        for invoice, parsed in zip(invoices, parsed_invoices):
+            for product_data in parsed['products']:
+                product = products[product_name(product_data)]
+                items.append({
+                    'invoice_id': invoice.id,
+                    'product_id': product.id,
+                    'qty': product_data['quantity'],
+                    'unit_price': product.unit_price,
+                    'total': product_data['quantity'] * product.unit_price,
+                    'organization_id': organization_id
+                })
+        if items:
+            db.session.bulk_insert_mappings(InvoiceItem, items)
+
+        # Daily rollups and customer features are updated in the same
+        # transaction as the invoices
+        record_invoices(invoices, items)
+        record_customer_features(invoices, items)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return invoices, errors
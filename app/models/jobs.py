@@ -0,0 +1,209 @@
+import os
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from .db import db, Document
+from .doc_cache import result_cache, upload_path
+from .search import search_index
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def process_document(document, file_path):
+    # Heavy OCR imports are deferred until a worker actually needs them
+    from .ocr import extract_text_from_image, correct_text
+
+    extracted_text = extract_text_from_image(file_path)
+    corrected_text, labeled_text = correct_text(extracted_text)
+
+    document.text = extracted_text
+    document.corrected_text = corrected_text
+    document.labeled_text = labeled_text
+
+    # Later uploads of the same content skip OCR entirely
+    if document.content_hash:
+        result_cache.put(document.content_hash, {
+            'text': extracted_text,
+            'corrected_text': corrected_text,
+            'labeled_text': labeled_text
+        })
+
+    # Indexed in the same transaction that stores the text
+    search_index.index_document(document)
+
+
+# Bounded in-process job queue for document ingestion. Job state lives on
+# the Document row itself, so no external broker is needed and any worker
+# process can answer status polls from the database.
+class JobQueue:
+    def __init__(self, workers=2, max_pending=32, max_attempts=3, lease_seconds=3600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.started_at = datetime.utcnow()
+        self.app = None
+        self._queue = None
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', self.max_pending)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', self.lease_seconds)
+        self.started_at = datetime.utcnow()
+
+    def _start(self):
+        # Workers are started on first use so importing the app or running
+        # CLI commands does not spawn threads
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=self.max_pending)
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                threading.Thread(target=self._recover, name='job-recovery', daemon=True).start()
+
+    def _recover(self):
+        # Documents a previous run left pending were only queued in that
+        # process's memory, so queue them again here. Processing documents
+        # are only taken over once their lease has run out, so documents
+        # another live process is still working on are left alone. Anything
+        # created after this process started was submitted by it already.
+        # A document queued by several processes is still processed once,
+        # see _claim.
+        with self.app.app_context():
+            expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+            documents = Document.query.filter(
+                Document.created_at < self.started_at,
+                or_(Document.status == PENDING,
+                    and_(Document.status == PROCESSING,
+                         or_(Document.claimed_at.is_(None), Document.claimed_at < expired)))
+            ).order_by(Document.id).all()
+
+            requeued = 0
+            for document in documents:
+                attempt = (document.attempts or 0) + 1
+                file_path = None
+                if document.content_hash:
+                    file_path = upload_path(self.app.config['UPLOAD_FOLDER'], document.content_hash, document.filename)
+
+                # Only rows nobody changed since they were read are updated
+                unchanged = Document.query.filter(
+                    Document.id == document.id, Document.status == document.status,
+                    Document.attempts == document.attempts
+                )
+                if attempt > self.max_attempts or file_path is None or not os.path.exists(file_path):
+                    unchanged.update({
+                        Document.status: FAILED,
+                        Document.error: document.error or 'Interrupted by a restart'
+                    }, synchronize_session=False)
+                    db.session.commit()
+                    continue
+                if document.status == PROCESSING:
+                    released = unchanged.update({Document.status: PENDING}, synchronize_session=False)
+                    db.session.commit()
+                    if not released:
+                        continue
+
+                try:
+                    self._queue.put_nowait((document.id, file_path, attempt))
+                    requeued += 1
+                except queue.Full:
+                    # The rest stay pending and are picked up on the next start
+                    break
+            if documents:
+                logging.info(f'Requeued {requeued} of {len(documents)} interrupted documents')
+
+    def full(self):
+        self._start()
+        return self._queue.full()
+
+    def submit(self, doc_id, file_path):
+        # Returns False when the queue is at capacity so the caller can
+        # push back on the client instead of piling up work
+        self._start()
+        try:
+            self._queue.put_nowait((doc_id, file_path, 1))
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            doc_id, file_path, attempt = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self._process(doc_id, file_path, attempt)
+            except Exception:
+                logging.exception(f'Job worker crashed on document {doc_id}')
+            finally:
+                self._queue.task_done()
+
+    def _claim(self, doc_id, attempt):
+        # Atomic pending -> processing switch, so a document queued twice
+        # (by recovery, or by more than one process) is processed once
+        claimed = Document.query.filter(Document.id == doc_id, Document.status == PENDING).update({
+            Document.status: PROCESSING,
+            Document.attempts: attempt,
+            Document.claimed_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _process(self, doc_id, file_path, attempt):
+        if not self._claim(doc_id, attempt):
+            logging.info(f'Document {doc_id} was already claimed, skipping')
+            return
+        document = Document.query.get(doc_id)
+
+        try:
+            process_document(document, file_path)
+            document.status = DONE
+            document.error = None
+            db.session.commit()
+            logging.info(f'Document {doc_id} processed on attempt {attempt}')
+        except Exception as e:
+            db.session.rollback()
+            document = Document.query.get(doc_id)
+            logging.error(f'Document {doc_id} failed on attempt {attempt}: {e}')
+            document.error = str(e)
+            document.status = PENDING if attempt < self.max_attempts else FAILED
+            db.session.commit()
+
+            if document.status == PENDING:
+                try:
+                    self._queue.put_nowait((doc_id, file_path, attempt + 1))
+                except queue.Full:
+                    document.status = FAILED
+                    db.session.commit()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'max_attempts': self.max_attempts,
+            'queued': self._queue.qsize() if self._queue else 0
+        }
+
+
+job_queue = JobQueue()
+
+
+def job_status(document):
+    return {
+        'id': document.id,
+        'filename': document.filename,
+        'status': document.status,
+        'attempts': document.attempts,
+        'error': document.error,
+        'created_at': document.created_at.strftime('%Y-%m-%d %H:%M:%S') if document.created_at else None
+    }
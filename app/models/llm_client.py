@@ -0,0 +1,158 @@
+import re
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import openai
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+def _normalize(prompt):
+    # Prompts differing only in case or spacing share a cache entry
+    return WHITESPACE.sub(' ', prompt).strip().casefold()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Shared front for every completion request. Answers are cached by
+# normalized prompt with a TTL and LRU eviction, identical prompts already
+# in flight wait for the same upstream call, each call has a timeout, and
+# after repeated failures a circuit breaker fails fast for a while instead
+# of tying up workers on a struggling upstream.
+class LLMClient:
+    def __init__(self, api_key=None, api_base=None, timeout=20, cache_size=1000, cache_ttl=3600,
+                 failure_threshold=5, reset_seconds=30):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # key -> (expires_at, text)
+        self._in_flight = {}          # key -> _Call
+        self._failures = 0
+        self._opened_at = None
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0, 'rejected': 0}
+
+    def init_app(self, app):
+        self.api_key = app.config.get('OPENAI_API_KEY', self.api_key)
+        self.api_base = app.config.get('OPENAI_API_BASE', self.api_base)
+        self.timeout = app.config.get('LLM_TIMEOUT', self.timeout)
+        self.cache_size = app.config.get('LLM_CACHE_SIZE', self.cache_size)
+        self.cache_ttl = app.config.get('LLM_CACHE_TTL', self.cache_ttl)
+        self.failure_threshold = app.config.get('LLM_FAILURE_THRESHOLD', self.failure_threshold)
+        self.reset_seconds = app.config.get('LLM_RESET_SECONDS', self.reset_seconds)
+
+    @staticmethod
+    def _key(model, prompt, max_tokens, temperature):
+        payload = json.dumps([model, _normalize(prompt), max_tokens, temperature])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, text):
+        self._cache[key] = (time.time() + self.cache_ttl, text)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _allow(self):
+        # Closed: calls go through. Open: rejected until reset_seconds have
+        # passed, then one trial call is let through (half open).
+        if self._opened_at is None:
+            return True
+        if time.time() - self._opened_at >= self.reset_seconds:
+            self._opened_at = time.time()
+            return True
+        return False
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+            else:
+                self._stats['errors'] += 1
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = time.time()
+
+    def complete(self, prompt, model, max_tokens=150, temperature=None):
+        key = self._key(model, prompt, max_tokens, temperature)
+        with self._lock:
+            text = self._cached(key)
+            if text is not None:
+                self._stats['hits'] += 1
+                return text
+
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                if not self._allow():
+                    self._stats['rejected'] += 1
+                    raise LLMUnavailable('Language model is unavailable, please try again shortly')
+                call = self._in_flight[key] = _Call()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                raise LLMUnavailable('Timed out waiting for the language model')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            options = {'temperature': temperature} if temperature is not None else {}
+            response = openai.Completion.create(
+                model=model, prompt=prompt, max_tokens=max_tokens, n=1,
+                api_key=self.api_key, api_base=self.api_base, request_timeout=self.timeout, **options
+            )
+            call.result = response.choices[0].text.strip()
+            self._record(True)
+            with self._lock:
+                self._store(key, call.result)
+            return call.result
+        except Exception as e:
+            logging.error(f'Language model call failed: {e}')
+            self._record(False)
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = len(self._cache)
+            stats['in_flight'] = len(self._in_flight)
+            stats['circuit'] = 'closed' if self._opened_at is None else 'open'
+        return stats
+
+
+llm_client = LLMClient()
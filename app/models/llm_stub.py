@@ -0,0 +1,56 @@
+import json
+import time
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Minimal stand-in for the OpenAI completions endpoint, for exercising the
+# LLM client (cache, coalescing, timeouts, circuit breaker) locally. Point
+# OPENAI_API_BASE at http://127.0.0.1:<port>/v1 to use it.
+def make_handler(delay=0.0, fail_every=0):
+    counter = itertools.count(1)
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/completions'):
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            number = next(counter)
+            time.sleep(delay)
+
+            if fail_every and number % fail_every == 0:
+                self._reply(500, {'error': {'message': 'Stub failure', 'type': 'server_error'}})
+                return
+
+            self._reply(200, {
+                'id': f'stub-{number}',
+                'object': 'text_completion',
+                'created': int(time.time()),
+                'model': body.get('model'),
+                'choices': [{'text': f" Stub answer #{number} to: {str(body.get('prompt'))[:200]}",
+                             'index': 0, 'logprobs': None, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            })
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+def serve(host='127.0.0.1', port=8081, delay=0.0, fail_every=0):
+    server = ThreadingHTTPServer((host, port), make_handler(delay, fail_every))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -1,42 +1,160 @@
-import torch
+import threading
+import time
+from collections import deque, namedtuple
 from PIL import Image
 import numpy as np
-import cv2
-from pathlib import Path
+from .registry import registry
+from .inference import TorchBackend, OnnxBackend
 
-# Load the YOLOv5 model
-model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
+# One detector per worker, shared by item scanning and goods receipts.
+# ultralytics loads YOLOv8 and YOLOv5u weights alike from the model path.
+def load_detector():
+    from ultralytics import YOLO
+    return YOLO(detection_service.model_path)
 
-def detect_objects(image_path):
-    # Perform inference
-    results = model(image_path)
-    return results
+registry.register('detector', load_detector)
 
-def crop_objects(image_path, results):
-    detected_items = []
-    image_pil = Image.open(image_path)
-    image_np = np.array(image_pil)
+def load_detector_onnx():
+    return OnnxBackend(detection_service.onnx_path, threads=detection_service.threads,
+                       providers=detection_service.onnx_providers)
 
-    for *box, conf, cls in results.xyxy[0]:
-        left, top, right, bottom = map(int, box)
-        confidence = float(conf)
-        class_id = int(cls)
-        label = model.names[class_id]
+def load_rgb(image_path):
+    return np.array(Image.open(image_path).convert('RGB'))
 
-        cropped_image_np = image_np[top:bottom, left:right]
-        cropped_image_pil = Image.fromarray(cropped_image_np)
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)]
 
-        # Save the cropped image temporarily
-        cropped_image_path = 'temp.jpg'
-        cropped_image_pil.save(cropped_image_path)
 
-        detected_item = {
-            'label': label,
-            'confidence': confidence,
-            'coordinates': (left, top, right, bottom),
-            'image_path': cropped_image_path
+class Detection(namedtuple('Detection', 'label class_id confidence box')):
+    # box is (left, top, right, bottom) in pixels of the source image
+    def serialize(self):
+        return {
+            'label': self.label,
+            'class_id': self.class_id,
+            'confidence': self.confidence,
+            'bounding_box': list(self.box)
         }
-        detected_items.append(detected_item)
 
-    return detected_items
 
+# Batched object detection on in-memory images. The model comes from the
+# shared registry so each worker loads it once; images are run through it
+# batch_size at a time and per-batch latencies are kept for monitoring.
+# The backend is either the torch model or an exported ONNX copy of it.
+class DetectionService:
+    def __init__(self, model_path='yolov8n.pt', batch_size=8, threads=None, backend='torch', onnx_path=None,
+                 onnx_providers=None, window=1000):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.threads = threads
+        self.backend_name = backend
+        self.onnx_path = onnx_path
+        self.onnx_providers = onnx_providers
+        self._lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+        self._threads_applied = False
+        self._latencies = deque(maxlen=window)  # (seconds, images) per batch
+        self._stats = {'images': 0, 'batches': 0, 'seconds': 0.0}
+
+    def init_app(self, app):
+        self.model_path = app.config.get('DETECTION_MODEL_PATH', self.model_path)
+        self.batch_size = app.config.get('DETECTION_BATCH_SIZE', self.batch_size)
+        self.threads = app.config.get('DETECTION_THREADS', self.threads)
+        self.backend_name = app.config.get('DETECTION_BACKEND', self.backend_name)
+        self.onnx_path = app.config.get('DETECTION_ONNX_PATH', self.onnx_path)
+        self.onnx_providers = app.config.get('DETECTION_ONNX_PROVIDERS', self.onnx_providers)
+        if self.backend_name not in ('torch', 'onnx'):
+            raise ValueError(f'Unknown detection backend {self.backend_name!r}')
+        if self.backend_name == 'onnx':
+            registry.register('detector_onnx', load_detector_onnx)
+
+    def backend(self, name=None):
+        name = name or self.backend_name
+        if name == 'onnx':
+            return registry.get('detector_onnx')
+
+        model = registry.get('detector')
+        with self._lock:
+            if self.threads and not self._threads_applied:
+                import torch
+                torch.set_num_threads(self.threads)
+                self._threads_applied = True
+        return TorchBackend(model)
+
+    @property
+    def names(self):
+        return self.backend().names
+
+    def detect(self, images):
+        # images are RGB arrays; returns a list of Detection per image
+        backend = self.backend()
+        names = backend.names
+        return [
+            [Detection(names[int(cls)], int(cls), float(conf), tuple(float(value) for value in box))
+             for *box, conf, cls in rows]
+            for rows in self.predict(images, backend)
+        ]
+
+    def predict(self, images, backend=None):
+        # Raw backend rows: one (n, 6) array per image of left, top, right,
+        # bottom, confidence, class_id
+        backend = backend or self.backend()
+        detections = []
+        for start in range(0, len(images), self.batch_size):
+            batch = list(images[start:start + self.batch_size])
+            began = time.perf_counter()
+            if backend.name == 'torch':
+                # The ultralytics predictor keeps per-call state, so torch
+                # batches from concurrent requests take turns
+                with self._predict_lock:
+                    detections.extend(backend.predict(batch))
+            else:
+                detections.extend(backend.predict(batch))
+            self._record(len(batch), time.perf_counter() - began)
+        return detections
+
+    def _record(self, images, seconds):
+        with self._lock:
+            self._latencies.append((seconds, images))
+            self._stats['images'] += images
+            self._stats['batches'] += 1
+            self._stats['seconds'] += seconds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = [seconds / images for seconds, images in self._latencies]
+        stats['backend'] = self.backend_name
+        stats['batch_size'] = self.batch_size
+        stats['threads'] = self.threads
+        stats['images_per_second'] = round(stats['images'] / stats['seconds'], 2) if stats['seconds'] else None
+        stats['p50_ms'] = round(_percentile(latencies, 50) * 1000, 2) if latencies else None
+        stats['p99_ms'] = round(_percentile(latencies, 99) * 1000, 2) if latencies else None
+        stats['seconds'] = round(stats['seconds'], 3)
+        return stats
+
+
+detection_service = DetectionService()
+
+
+def detect_objects(image_path):
+    return detection_service.detect([load_rgb(image_path)])[0]
+
+def crop_objects(image, detections):
+    # Crops stay in memory and are handed straight to OCR
+    height, width = image.shape[:2]
+    detected_items = []
+
+    for detection in detections:
+        left, top, right, bottom = map(int, detection.box)
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+
+        detected_items.append({
+            'label': detection.label,
+            'confidence': detection.confidence,
+            'coordinates': (left, top, right, bottom),
+            'image': image[top:bottom, left:right]
+        })
+
+    return detected_items
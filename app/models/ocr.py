@@ -1,16 +1,26 @@
 import os
 import cv2
 import numpy as np
-import easyocr
-import spacy
 from langdetect import detect
-from symspellpy.symspellpy import SymSpell, Verbosity
-from pathlib import Path
-
-# Initialize spaCy models
-nlp_en = spacy.load("en_core_web_sm")
-nlp_id = spacy.load("xx_ent_wiki_sm")
-#nlp_ar = spacy.load("ar_ent_wiki_sm")
+from .reader_pool import reader_pool
+from .preprocessing import load_image, enhance_pipeline, clean_pipeline, ocr_pipeline
+from .batch_ocr import is_pdf, extract_text_from_document
+from .registry import registry
+from .object_detection import detection_service, load_rgb, crop_objects
+from .region_ocr import read_regions
+from .symspell_snapshot import load_symspell
+from .correction import correct_document
+
+# spaCy models are loaded on first use through the shared registry
+def load_spacy(name):
+    def loader():
+        import spacy
+        return spacy.load(name)
+    return loader
+
+registry.register('spacy_en', load_spacy("en_core_web_sm"))
+registry.register('spacy_id', load_spacy("xx_ent_wiki_sm"))
+#registry.register('spacy_ar', load_spacy("ar_ent_wiki_sm"))
 
 # Praproses Gambar
 def preprocess_image_v1(image_path):
@@ -41,49 +51,22 @@ def preprocess_image_v1(image_path):
     return preprocessed_image_path
 
 def preprocess_image(image_path):
-    # Load image
-    image = cv2.imread(image_path)
-
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # Increase brightness
-    alpha = 1.5 # Simple contrast control
-    beta = 50    # Simple brightness control
-    bright_image = cv2.convertScaleAbs(gray, alpha=alpha, beta=beta)
+    # Grayscale, brightness and contrast stages, written to disk for callers
+    # that still need a file; the OCR path keeps the image in memory
+    contrast_image = enhance_pipeline.run(load_image(image_path), name=image_path)
 
-    # Increase contrast
-    contrast_image = cv2.equalizeHist(bright_image)
-    
-    #Simpan gambar setelah praproses
-    # Define the directory to save the cleaned images
     preprocessed_images_dir = 'preprocessed_uploads'
-    # Create the directory if it doesn't exist
     os.makedirs(preprocessed_images_dir, exist_ok=True)
-    # Save the cleaned image in the specified directory
     preprocessed_image_path = os.path.join(preprocessed_images_dir, 'preprocessed_' + os.path.basename(image_path))
     cv2.imwrite(preprocessed_image_path, contrast_image)
 
     return preprocessed_image_path
     
 def clean_image(image_path):
-    # Load the preprocessed image
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-
-    # Apply GaussianBlur to remove noise
-    blurred = cv2.GaussianBlur(image, (5, 5), 0)
-
-    # Apply thresholding to binarize image
-    _, thresholded = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Blur, Otsu threshold and morphological close, written to disk
+    cleaned_image = clean_pipeline.run(load_image(image_path), name=image_path)
 
-    # Apply morphological operations to further clean image
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-    cleaned_image = cv2.morphologyEx(thresholded, cv2.MORPH_CLOSE, kernel)
-    
-    # Save the cleaned image in the specified directory
-    # Define the directory to save the cleaned images
     cleaned_images_dir = 'cleaned_uploads'
-    # Create the directory if it doesn't exist
     os.makedirs(cleaned_images_dir, exist_ok=True)
     cleaned_image_path = os.path.join(cleaned_images_dir, 'cleaned_' + os.path.basename(image_path))
     cv2.imwrite(cleaned_image_path, cleaned_image)
@@ -91,41 +74,47 @@ def clean_image(image_path):
     return cleaned_image_path
 
 def extract_text_from_image(image_path):
-    # Preprocess image
-    preprocessed_image = preprocess_image(image_path)
+    # Multi-page PDFs are rasterized and OCR'd in batches
+    if is_pdf(image_path):
+        return extract_text_from_document(image_path)
 
-    # Clean image
-    cleaned_image = clean_image(preprocessed_image)
+    # Decode once and run every preprocessing stage in memory
+    cleaned_image = ocr_pipeline.run(load_image(image_path), name=image_path)
 
     # Extract text using OCR
-    reader = easyocr.Reader(['en', 'id'])
-    result = reader.readtext(cleaned_image, detail=0)
+    with reader_pool.reader(['en', 'id']) as reader:
+        result = reader.readtext(cleaned_image, detail=0)
     text = ' '.join(result)
     
     return text
 
 def scan_and_detect(image_path):
-    # Perform object detection
-    results = detect_objects(image_path)
-    detected_items = crop_objects(image_path, results)
-
-    for item in detected_items:
-        # Perform OCR on the cropped image
-        ocr_results = reader.readtext(item['image_path'])
-        item['text'] = ocr_results
-
-    return detected_items
+    return scan_and_detect_images([load_rgb(image_path)])[0]
+
+def scan_and_detect_images(images):
+    # Detection runs over all images in batches, then the detected boxes go
+    # straight to recognition; small or doubtful boxes get no text
+    detections = detection_service.detect(images)
+    texts = read_regions(images, detections)
+    scanned = []
+
+    for image, boxes, box_texts in zip(images, detections, texts):
+        detected_items = crop_objects(image, boxes)
+        for item, text in zip(detected_items, box_texts):
+            item.pop('image')
+            item['text'] = text[0] if text else None
+            item['text_confidence'] = text[1] if text else None
+        scanned.append(detected_items)
+
+    return scanned
     
-# Initialize SymSpell for Indonesian
-def create_symspell(max_edit_distance_dictionary, prefix_length):
-    symspell = SymSpell(max_edit_distance_dictionary, prefix_length)
-    dictionary_path = os.path.join(os.path.dirname(__file__), "frequency_dictionary_id.txt")
-    with open(dictionary_path, 'r', encoding='utf-8') as f:
-        corpus = Path(dictionary_path)
-        symspell.load_dictionary(str(corpus), 0, 1)
-    return symspell
+# Initialize SymSpell from a prebuilt snapshot, rebuilt when the source
+# dictionary changes
+def create_symspell(max_edit_distance_dictionary, prefix_length, language='id'):
+    return load_symspell(language, max_edit_distance_dictionary, prefix_length)
 
-symspell_id = create_symspell(2, 7)
+registry.register('symspell_id', lambda: create_symspell(2, 7, 'id'))
+registry.register('symspell_en', lambda: create_symspell(2, 7, 'en'))
 
 def correct_text(text):
     try:
@@ -141,33 +130,16 @@ def correct_text(text):
         return text, 'unknown'
 
 def correct_english_text(text):
-    spell = SpellChecker()
-    corrected_text = []
-    words = text.split()
-    
-    for word in words:
-        corrected_word = spell.correction(word)
-        # Retain original casing
-        if word.istitle():
-            corrected_word = corrected_word.capitalize()
-        elif word.isupper():
-            corrected_word = corrected_word.upper()
-        corrected_text.append(corrected_word)
-    
-    return ' '.join(corrected_text)
+    return correct_document(text, 'en')
 
 def correct_indonesian_text(text):
-    suggestions = symspell_id.lookup_compound(text, max_edit_distance=2)
-    if suggestions:
-        return suggestions[0].term
-    else:
-        return text
+    return correct_document(text, 'id')
 
 def label_entities(text, language):
     if language == 'en':
-        doc = nlp_en(text)
+        doc = registry.get('spacy_en')(text)
     elif language == 'id':
-        doc = nlp_id(text)
+        doc = registry.get('spacy_id')(text)
     else:
         return []
 
@@ -0,0 +1,30 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import or_, and_
+
+
+# Opaque keyset cursors over (created_at, id). Rows are read newest first
+# and each page starts strictly after the last row of the previous one, so
+# page N costs the same as page 1 regardless of table size.
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def after_cursor(query, created_at_column, id_column, cursor):
+    created_at, row_id = decode_cursor(cursor)
+    if created_at is None:
+        # Rows without a timestamp sort last; only the id breaks ties there
+        return query.filter(created_at_column.is_(None), id_column < row_id)
+    return query.filter(or_(
+        created_at_column < created_at,
+        and_(created_at_column == created_at, id_column < row_id),
+        created_at_column.is_(None)
+    ))
@@ -0,0 +1,81 @@
+import os
+import cv2
+
+
+# Each stage takes a NumPy image and returns a new one, so stages can be
+# chained without writing intermediate files to disk.
+def grayscale(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def brighten(alpha=1.5, beta=50):
+    # alpha: simple contrast control, beta: simple brightness control
+    def stage(image):
+        return cv2.convertScaleAbs(image, alpha=alpha, beta=beta)
+    stage.__name__ = 'brighten'
+    return stage
+
+def equalize(image):
+    return cv2.equalizeHist(image)
+
+def blur(ksize=(5, 5)):
+    def stage(image):
+        return cv2.GaussianBlur(image, ksize, 0)
+    stage.__name__ = 'blur'
+    return stage
+
+def otsu_threshold(image):
+    _, thresholded = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return thresholded
+
+def morph_close(ksize=(3, 3)):
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, ksize)
+    def stage(image):
+        return cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
+    stage.__name__ = 'morph_close'
+    return stage
+
+
+class Pipeline:
+    # Debug output is opt-in; when set, every stage result is written here
+    debug_dir = None
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    @classmethod
+    def init_app(cls, app):
+        cls.debug_dir = app.config.get('OCR_DEBUG_DIR')
+
+    def then(self, *stages):
+        return Pipeline(self.stages + list(stages))
+
+    def run(self, image, name='image'):
+        for index, stage in enumerate(self.stages):
+            image = stage(image)
+            if self.debug_dir:
+                self._dump(image, name, index, stage.__name__)
+        return image
+
+    def _dump(self, image, name, index, stage_name):
+        os.makedirs(self.debug_dir, exist_ok=True)
+        base = os.path.splitext(os.path.basename(name))[0]
+        cv2.imwrite(os.path.join(self.debug_dir, f'{base}_{index}_{stage_name}.png'), image)
+
+
+# Stages previously done by preprocess_image (grayscale, brightness, contrast)
+enhance_pipeline = Pipeline([grayscale, brighten(), equalize])
+
+# Stages previously done by clean_image (denoise, binarize, close gaps)
+clean_pipeline = Pipeline([grayscale, blur(), otsu_threshold, morph_close()])
+
+# Full path used before handing the image to the OCR engine
+ocr_pipeline = enhance_pipeline.then(*clean_pipeline.stages[1:])
+
+
+def load_image(image_path):
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f'Unable to read image: {image_path}')
+    return image
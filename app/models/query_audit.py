@@ -0,0 +1,195 @@
+import time
+import random
+import statistics
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, inspect, select, func
+from .db import (db, Document, Organization, Customer, Product, Invoice, InvoiceItem, Purchase, PurchaseItem,
+                 Account, AccountTransaction, SalesRollup)
+
+SEED_CHUNK_SIZE = 5000
+
+
+def create_indexes(engine):
+    # Add any index declared on the models that an existing database is
+    # missing; create_all only does this for brand new tables
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def _insert(conn, model, rows):
+    for start in range(0, len(rows), SEED_CHUNK_SIZE):
+        conn.execute(model.__table__.insert(), rows[start:start + SEED_CHUNK_SIZE])
+
+def seed(engine, invoices=100000, organizations=20):
+    # Synthetic data shaped like production: many invoices per customer, a
+    # few items per invoice and one document per invoice
+    rng = random.Random(42)
+    customers = max(invoices // 20, 1)
+    products = max(invoices // 50, 1)
+    first_day = date(2020, 1, 1)
+    now = datetime.utcnow()
+
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        _insert(conn, Organization, [{'id': i, 'name': f'Org {i}'} for i in range(1, organizations + 1)])
+        _insert(conn, Customer, [
+            {'id': i, 'name': f'Customer {i}', 'organization_id': rng.randint(1, organizations), 'created': now, 'updated': now}
+            for i in range(1, customers + 1)
+        ])
+        _insert(conn, Product, [
+            {'id': i, 'name': f'Product {i}', 'unit_price': rng.randint(100, 100000) / 100,
+             'organization_id': rng.randint(1, organizations), 'created': now, 'updated': now}
+            for i in range(1, products + 1)
+        ])
+
+        invoice_rows, item_rows, document_rows = [], [], []
+        for i in range(1, invoices + 1):
+            day = first_day + timedelta(days=rng.randint(0, 4 * 365))
+            organization_id = rng.randint(1, organizations)
+            invoice_rows.append({'id': i, 'date': day, 'customer_id': rng.randint(1, customers),
+                                 'organization_id': organization_id, 'created': now, 'updated': now})
+            for _ in range(rng.randint(1, 5)):
+                qty = rng.randint(1, 10)
+                price = rng.randint(100, 100000) / 100
+                item_rows.append({'invoice_id': i, 'product_id': rng.randint(1, products), 'qty': qty,
+                                  'unit_price': price, 'total': qty * price, 'organization_id': organization_id,
+                                  'created': now, 'updated': now})
+            document_rows.append({'filename': f'scan_{i}.png', 'text': 'synthetic', 'doc_type': rng.choice(['invoice', 'purchase', 'other']),
+                                  'status': 'done', 'attempts': 1, 'created_at': datetime.combine(day, datetime.min.time())})
+        _insert(conn, Invoice, invoice_rows)
+        _insert(conn, InvoiceItem, item_rows)
+        _insert(conn, Document, document_rows)
+
+        purchase_rows, purchase_item_rows = [], []
+        for i in range(1, invoices // 4 + 1):
+            organization_id = rng.randint(1, organizations)
+            purchase_rows.append({'id': i, 'date': first_day + timedelta(days=rng.randint(0, 4 * 365)),
+                                  'organization_id': organization_id, 'created': now, 'updated': now})
+            for _ in range(rng.randint(1, 5)):
+                qty = rng.randint(1, 10)
+                price = rng.randint(100, 100000) / 100
+                purchase_item_rows.append({'purchase_id': i, 'product_id': rng.randint(1, products), 'qty': qty,
+                                           'unit_price': price, 'total': qty * price, 'organization_id': organization_id,
+                                           'created': now, 'updated': now})
+        _insert(conn, Purchase, purchase_rows)
+        _insert(conn, PurchaseItem, purchase_item_rows)
+
+        _insert(conn, Account, [{'id': i, 'name': f'Account {i}', 'organization_id': i, 'created': now, 'updated': now}
+                                for i in range(1, organizations + 1)])
+        _insert(conn, AccountTransaction, [
+            {'date': first_day + timedelta(days=rng.randint(0, 4 * 365)), 'amount': rng.randint(100, 100000) / 100,
+             'account_id': rng.randint(1, organizations), 'organization_id': rng.randint(1, organizations),
+             'created': now, 'updated': now}
+            for _ in range(invoices)
+        ])
+
+
+# The queries behind Document.get_documents, sales_report, save_invoice_data
+# and the per-organization exports, with representative parameters
+HOT_QUERIES = {
+    'documents_by_type_and_date': lambda: select(Document.id, Document.filename).where(
+        Document.doc_type == 'invoice',
+        Document.created_at >= datetime(2022, 1, 1), Document.created_at <= datetime(2022, 3, 31)
+    ).order_by(Document.created_at, Document.id),
+    'documents_by_date': lambda: select(Document.id, Document.filename).where(
+        Document.created_at >= datetime(2022, 1, 1), Document.created_at <= datetime(2022, 1, 31)
+    ),
+    'invoices_by_organization_and_date': lambda: select(func.count(Invoice.id)).where(
+        Invoice.organization_id == 3, Invoice.date >= date(2022, 1, 1), Invoice.date <= date(2022, 12, 31)
+    ),
+    'invoices_by_date': lambda: select(func.count(Invoice.id)).where(
+        Invoice.date >= date(2022, 1, 1), Invoice.date <= date(2022, 1, 31)
+    ),
+    'invoice_items_by_date': lambda: select(func.sum(InvoiceItem.qty * InvoiceItem.unit_price)).select_from(Invoice).join(
+        InvoiceItem, InvoiceItem.invoice_id == Invoice.id
+    ).where(Invoice.date >= date(2022, 1, 1), Invoice.date <= date(2022, 1, 31)),
+    'invoice_items_by_organization': lambda: select(InvoiceItem.id, InvoiceItem.qty).where(
+        InvoiceItem.organization_id == 3
+    ),
+    'purchase_items_by_organization': lambda: select(PurchaseItem.id, PurchaseItem.qty).where(
+        PurchaseItem.organization_id == 3
+    ),
+    'customers_by_name': lambda: select(Customer.id, Customer.name).where(
+        Customer.name.in_([f'Customer {i}' for i in range(1, 50)])
+    ),
+    'products_by_name': lambda: select(Product.id, Product.name).where(
+        Product.name.in_([f'Product {i}' for i in range(1, 50)])
+    ),
+    'customers_by_organization_and_name': lambda: select(Customer.id).where(
+        Customer.organization_id == 3, Customer.name == 'Customer 42'
+    ),
+    'account_transactions_by_organization_and_date': lambda: select(func.sum(AccountTransaction.amount)).where(
+        AccountTransaction.organization_id == 3,
+        AccountTransaction.date >= date(2022, 1, 1), AccountTransaction.date <= date(2022, 3, 31)
+    ),
+    'sales_rollup_by_date': lambda: select(func.sum(SalesRollup.revenue)).where(
+        SalesRollup.date >= date(2022, 1, 1), SalesRollup.date <= date(2022, 1, 31)
+    ),
+}
+
+
+def _plain_params(compiled):
+    # EXPLAIN goes straight to the driver, so bind processors are skipped;
+    # plain ISO strings are enough for the planner
+    params = {key: value.isoformat(' ') if isinstance(value, datetime) else value.isoformat() if isinstance(value, date) else value
+              for key, value in compiled.params.items()}
+    if compiled.positional:
+        return tuple(params[key] for key in compiled.positiontup)
+    return params
+
+def explain(conn, statement):
+    # render_postcompile expands IN (...) lists into ordinary bind params
+    compiled = statement.compile(conn.engine, compile_kwargs={'render_postcompile': True})
+    params = _plain_params(compiled)
+
+    if conn.engine.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).fetchall()
+        plan = [row[-1] for row in rows]
+        # A bare "SCAN table" is a full table scan; SEARCH or a scan of an
+        # index means the planner found a usable index
+        full_scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+        return plan, not full_scans
+
+    rows = conn.exec_driver_sql(f'EXPLAIN {compiled}', params).mappings().fetchall()
+    plan = [f"{row['table']}: type={row['type']} key={row['key']}" for row in rows]
+    full_scans = [row for row in rows if row['table'] and (row['type'] == 'ALL' or row['key'] is None)]
+    return plan, not full_scans
+
+def audit(engine, repeat=5):
+    results = []
+    with engine.connect() as conn:
+        for name, build in HOT_QUERIES.items():
+            statement = build()
+            plan, uses_index = explain(conn, statement)
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(statement).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+
+            results.append({
+                'query': name,
+                'uses_index': uses_index,
+                'median_ms': round(statistics.median(timings), 2),
+                'plan': plan
+            })
+    return results
+
+def run_audit(database_url, invoices=100000, reseed=True, repeat=5):
+    # Point this at a scratch database: reseeding drops every table first
+    engine = create_engine(database_url)
+    if reseed:
+        db.metadata.drop_all(engine)
+        seed(engine, invoices=invoices)
+    return audit(engine, repeat=repeat)
@@ -0,0 +1,103 @@
+import threading
+import queue
+from contextlib import contextmanager
+
+DEFAULT_LANGUAGES = ('en', 'id')
+# How often a caller waiting on an exhausted pool re-checks whether a slot
+# was freed by a failed reader build
+WAIT_POLL_SECONDS = 1.0
+
+
+# Process-wide pool of EasyOCR readers, keyed by language set.
+# Loading a Reader pulls the detection and recognition weights from disk,
+# so each reader is built once per worker and then reused across requests.
+class ReaderPool:
+    def __init__(self, size=1, gpu=False):
+        self.size = size
+        self.gpu = gpu
+        self._lock = threading.Lock()
+        self._idle = {}      # languages -> queue of idle readers
+        self._created = {}   # languages -> number of readers built so far
+        self._stats = {'hits': 0, 'misses': 0, 'waits': 0}
+
+    def init_app(self, app):
+        self.size = app.config.get('OCR_READER_POOL_SIZE', self.size)
+        self.gpu = app.config.get('OCR_READER_GPU', self.gpu)
+
+    @staticmethod
+    def _key(languages):
+        return tuple(sorted(languages or DEFAULT_LANGUAGES))
+
+    def _checkout(self, key):
+        waited = False
+        while True:
+            with self._lock:
+                idle = self._idle.setdefault(key, queue.LifoQueue())
+                try:
+                    reader = idle.get_nowait()
+                    self._stats['hits'] += 1
+                    return reader
+                except queue.Empty:
+                    pass
+
+                if self._created.get(key, 0) < self.size:
+                    # Reserve the slot before releasing the lock so concurrent
+                    # callers do not build more readers than the pool allows
+                    self._created[key] = self._created.get(key, 0) + 1
+                    self._stats['misses'] += 1
+                    build = True
+                else:
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    build = False
+
+            if build:
+                # easyocr pulls in torch, so it is only imported once a reader is needed
+                import easyocr
+                try:
+                    return easyocr.Reader(list(key), gpu=self.gpu)
+                except Exception:
+                    with self._lock:
+                        self._created[key] -= 1
+                    raise
+
+            # Pool is exhausted, wait for another request to return a reader.
+            # The timeout lets waiters notice a slot released by a failed
+            # build and build the replacement themselves.
+            try:
+                return idle.get(timeout=WAIT_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+    def _checkin(self, key, reader):
+        self._idle[key].put(reader)
+
+    @contextmanager
+    def reader(self, languages=None):
+        key = self._key(languages)
+        reader = self._checkout(key)
+        try:
+            yield reader
+        finally:
+            self._checkin(key, reader)
+
+    def warm(self, languages=None):
+        with self.reader(languages):
+            pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['readers'] = {
+                '+'.join(key): {
+                    'created': self._created.get(key, 0),
+                    'idle': idle.qsize()
+                }
+                for key, idle in self._idle.items()
+            }
+        return stats
+
+
+reader_pool = ReaderPool()
@@ -0,0 +1,208 @@
+import time
+import logging
+import threading
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select, func
+from .db import db, Invoice, InvoiceItem
+
+
+# Snapshot of the customer x product purchase matrix. Requests
+# read whichever snapshot is current while a refresh builds the next one.
+class PurchaseMatrix:
+    def __init__(self, customer_ids, product_ids, counts, last_item_id):
+        self.customer_ids = customer_ids
+        self.product_ids = product_ids
+        self.customers = {customer_id: row for row, customer_id in enumerate(customer_ids)}
+        self.products = {product_id: column for column, product_id in enumerate(product_ids)}
+        self.counts = counts.tocsr()
+        self.last_item_id = last_item_id
+        self.checked_at = time.time()
+
+        # log(1 + qty) so bulk buyers do not dominate, then unit rows so a dot
+        # product is the cosine similarity of two customers
+        weights = self.counts.copy()
+        weights.data = np.log1p(weights.data)
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        self.weights = sparse.csr_matrix(weights.multiply((1 / norms)[:, None]))
+        # Column-major copy: who bought a given product, without a full scan
+        self.by_product = self.weights.tocsc()
+        self.popularity = np.asarray(self.counts.sum(axis=0)).ravel()
+
+
+def _purchases(after_item_id, up_to_item_id):
+    query = select(
+        Invoice.customer_id, InvoiceItem.product_id, func.sum(InvoiceItem.qty)
+    ).select_from(InvoiceItem).join(Invoice, Invoice.id == InvoiceItem.invoice_id).where(
+        Invoice.customer_id.isnot(None), InvoiceItem.product_id.isnot(None),
+        InvoiceItem.id > after_item_id, InvoiceItem.id <= up_to_item_id
+    ).group_by(Invoice.customer_id, InvoiceItem.product_id)
+    return db.session.execute(query).all()
+
+def _extend(ids, index, new_ids):
+    # Append unseen ids, keeping existing rows/columns where they are
+    added = [value for value in dict.fromkeys(new_ids) if value not in index]
+    return np.concatenate([ids, np.asarray(added, dtype=np.int64)]) if added else ids
+
+
+# Customer-to-customer recommendations: the customers whose purchases
+# overlap most (exact cosine over the sparse matrix) vote for their other
+# products by similarity. The matrix is refreshed from new InvoiceItem rows
+# in a background thread, and rebuilt from scratch now and then.
+class Recommender:
+    def __init__(self, refresh_seconds=60, rebuild_seconds=86400, neighbors=50):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.neighbors = neighbors
+        self._app = None
+        self._matrix = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.refresh_seconds = app.config.get('RECOMMENDATION_REFRESH_SECONDS', self.refresh_seconds)
+        self.rebuild_seconds = app.config.get('RECOMMENDATION_REBUILD_SECONDS', self.rebuild_seconds)
+        self.neighbors = app.config.get('RECOMMENDATION_NEIGHBORS', self.neighbors)
+
+    @staticmethod
+    def _empty():
+        empty = np.zeros(0, dtype=np.int64)
+        return PurchaseMatrix(empty, empty, sparse.csr_matrix((0, 0)), 0)
+
+    def refresh(self):
+        # Only items written since the last refresh are read and added
+        with self._lock:
+            self._update()
+        return self._matrix
+
+    def _build(self):
+        # From scratch, which also drops edited or deleted invoices
+        self._matrix = self._apply(self._empty())
+        self._built_at = time.time()
+
+    def _update(self):
+        if self._matrix is None or time.time() - self._built_at > self.rebuild_seconds:
+            self._build()
+        else:
+            self._matrix = self._apply(self._matrix)
+
+    def _refresh_in_background(self):
+        # At most one refresh at a time; requests keep reading the current
+        # snapshot until the new one replaces it
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._background_refresh, name='recommendation-refresh', daemon=True).start()
+        except Exception:
+            self._lock.release()
+            raise
+
+    def _background_refresh(self):
+        try:
+            with self._app.app_context():
+                self._update()
+        except Exception:
+            logging.exception('Refreshing the purchase matrix failed')
+        finally:
+            self._lock.release()
+
+    def _apply(self, matrix):
+        up_to = db.session.execute(select(func.max(InvoiceItem.id))).scalar() or 0
+        if up_to <= matrix.last_item_id:
+            matrix.checked_at = time.time()
+            return matrix
+        rows = _purchases(matrix.last_item_id, up_to)
+
+        customer_ids = _extend(matrix.customer_ids, matrix.customers, [row[0] for row in rows])
+        product_ids = _extend(matrix.product_ids, matrix.products, [row[1] for row in rows])
+        customers = {customer_id: row for row, customer_id in enumerate(customer_ids)}
+        products = {product_id: column for column, product_id in enumerate(product_ids)}
+
+        shape = (len(customer_ids), len(product_ids))
+        counts = matrix.counts.copy()
+        counts.resize(shape)
+        if rows:
+            delta = sparse.coo_matrix((
+                np.fromiter((float(row[2] or 0) for row in rows), dtype=np.float64, count=len(rows)),
+                (np.fromiter((customers[row[0]] for row in rows), dtype=np.int64, count=len(rows)),
+                 np.fromiter((products[row[1]] for row in rows), dtype=np.int64, count=len(rows)))
+            ), shape=shape)
+            counts = counts + delta
+        return PurchaseMatrix(customer_ids, product_ids, counts, up_to)
+
+    def matrix(self):
+        # Only the very first build happens inside a request
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._build()
+            return self._matrix
+        matrix = self._matrix
+        if time.time() - matrix.checked_at > self.refresh_seconds:
+            if self._app is not None:
+                self._refresh_in_background()
+            else:
+                self.refresh()
+                matrix = self._matrix
+        return matrix
+
+    def similar_customers(self, customer_id, k=None, matrix=None):
+        # Callers that also read the matrix pass their snapshot so both
+        # steps see the same one
+        matrix = matrix if matrix is not None else self.matrix()
+        row = matrix.customers.get(customer_id)
+        if row is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        # Only customers sharing a product with this one can be similar
+        vector = matrix.weights[row]
+        similarities = np.asarray((matrix.by_product[:, vector.indices] @ vector.data)).ravel()
+        similarities[row] = 0
+
+        k = min(k or self.neighbors, np.count_nonzero(similarities))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        nearest = np.argpartition(-similarities, k - 1)[:k]
+        nearest = nearest[np.argsort(-similarities[nearest])]
+        return nearest, similarities[nearest]
+
+    def recommend(self, customer_id, n=5):
+        matrix = self.matrix()
+        nearest, similarities = self.similar_customers(customer_id, matrix=matrix)
+
+        if len(nearest):
+            scores = np.asarray(matrix.weights[nearest].T @ similarities).ravel()
+        else:
+            # Unknown customers or no overlap: most bought products
+            scores = matrix.popularity.astype(np.float64)
+
+        # Products the customer already bought are not recommended again
+        row = matrix.customers.get(customer_id)
+        if row is not None:
+            scores[matrix.counts[row].indices] = 0
+
+        n = min(n, np.count_nonzero(scores))
+        if n == 0:
+            return []
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.argsort(-scores[best])]
+        return [{'product_id': int(matrix.product_ids[column]), 'score': round(float(scores[column]), 4)} for column in best]
+
+    def stats(self):
+        matrix = self._matrix
+        if matrix is None:
+            return {'built': False}
+        return {
+            'built': True,
+            'customers': len(matrix.customer_ids),
+            'products': len(matrix.product_ids),
+            'purchases': int(matrix.counts.nnz),
+            'last_item_id': matrix.last_item_id,
+            'checked_seconds_ago': round(time.time() - matrix.checked_at, 1),
+            'built_seconds_ago': round(time.time() - self._built_at, 1)
+        }
+
+
+recommender = Recommender()
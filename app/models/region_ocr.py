@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from .reader_pool import reader_pool
+
+# Detected boxes smaller than MIN_SIZE pixels on either side, or with a
+# detection confidence under MIN_CONFIDENCE, are not worth reading
+MIN_SIZE = 16
+MIN_CONFIDENCE = 0.3
+BATCH_SIZE = 16
+
+
+def init_app(app):
+    global MIN_SIZE, MIN_CONFIDENCE, BATCH_SIZE
+    MIN_SIZE = app.config.get('OCR_REGION_MIN_SIZE', MIN_SIZE)
+    MIN_CONFIDENCE = app.config.get('OCR_REGION_MIN_CONFIDENCE', MIN_CONFIDENCE)
+    BATCH_SIZE = app.config.get('OCR_REGION_BATCH_SIZE', BATCH_SIZE)
+
+def _region(detection, width, height):
+    left, top, right, bottom = detection.box
+    region = (max(int(left), 0), max(int(top), 0), min(int(right), width), min(int(bottom), height))
+    if detection.confidence < MIN_CONFIDENCE:
+        return None
+    if region[2] - region[0] < MIN_SIZE or region[3] - region[1] < MIN_SIZE:
+        return None
+    return region
+
+def _recognize(grey, regions, languages):
+    # horizontal_list boxes are [x_min, x_max, y_min, y_max]; EasyOCR reads
+    # each one as a line of text and skips its own text detection
+    with reader_pool.reader(languages) as reader:
+        results = reader.recognize(grey, horizontal_list=[[left, right, top, bottom] for left, top, right, bottom in regions],
+                                   free_list=[], batch_size=len(regions), detail=1)
+    # Results come back sorted top to bottom, so match them up by box
+    return {
+        (int(box[0][0]), int(box[0][1]), int(box[2][0]), int(box[2][1])): (text, float(confidence))
+        for box, text, confidence in results
+    }
+
+def read_regions(images, detections, languages=None):
+    # images are RGB arrays and detections their Detection lists. Returns,
+    # per image, (text, confidence) for each detection, or None where the
+    # box was filtered out.
+    languages = languages or ['en', 'id']
+    regions, chunks = [], []
+    for index, (image, boxes) in enumerate(zip(images, detections)):
+        height, width = image.shape[:2]
+        image_regions = [_region(detection, width, height) for detection in boxes]
+        regions.append(image_regions)
+
+        wanted = sorted({region for region in image_regions if region})
+        if wanted:
+            grey = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            for start in range(0, len(wanted), BATCH_SIZE):
+                chunks.append((index, grey, wanted[start:start + BATCH_SIZE]))
+
+    # Chunks run in parallel, one pooled reader each
+    texts = [{} for _ in images]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(reader_pool.size, 1)) as executor:
+            results = executor.map(lambda chunk: _recognize(chunk[1], chunk[2], languages), chunks)
+            for (index, _, _), result in zip(chunks, results):
+                texts[index].update(result)
+
+    return [
+        [texts[index].get(region) if region else None for region in image_regions]
+        for index, image_regions in enumerate(regions)
+    ]
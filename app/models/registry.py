@@ -0,0 +1,91 @@
+import os
+import time
+import logging
+import threading
+
+
+def _rss_bytes():
+    # Resident set size of this process, None where /proc is unavailable
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Central registry of heavy models (spaCy, SymSpell, YOLO, ...). Modules
+# register a loader at import time and call get() when they need the
+# model, so nothing is loaded until a route actually uses it and every
+# module in the worker shares the same instance.
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f'No model registered under {name!r}')
+
+        # One lock per model so unrelated models can load concurrently
+        with self._locks[name]:
+            if name not in self._models:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                load_time = time.perf_counter() - start
+                rss_after = _rss_bytes()
+
+                # RSS delta is approximate when other models load in parallel
+                self._stats[name] = {
+                    'load_seconds': round(load_time, 3),
+                    'rss_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+                }
+                logging.info(f'Loaded model {name} in {load_time:.2f}s')
+        return self._models[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm(self, names=None, background=True):
+        names = list(names or self._loaders)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    logging.exception(f'Failed to warm model {name}')
+
+        if not background:
+            load_all()
+            return None
+
+        thread = threading.Thread(target=load_all, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def init_app(self, app):
+        warmup = app.config.get('MODEL_WARMUP')
+        if warmup:
+            self.warm(None if warmup == 'all' else warmup, background=app.config.get('MODEL_WARMUP_BACKGROUND', True))
+
+    def stats(self):
+        return {
+            name: dict(self._stats.get(name, {}), loaded=name in self._models)
+            for name in self._loaders
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from sqlalchemy import func, distinct
+from .db import db, Customer, Product, Invoice, InvoiceItem, SalesRollup, ProductSalesRollup
+from .rollups import rollups_cover, as_date
+
+GROUP_BY_CHOICES = ('day', 'week', 'month', 'customer', 'product')
+STREAM_BATCH_SIZE = 1000
+
+
+def _filter_invoices(query, start_date=None, end_date=None, organization_id=None, model=Invoice):
+    # Undated invoices are never rolled up, so they are left out of the raw
+    # aggregates too. Compare against dates, not datetimes, so the first
+    # day is included.
+    query = query.filter(model.date.isnot(None))
+    if start_date:
+        query = query.filter(model.date >= as_date(start_date))
+    if end_date:
+        query = query.filter(model.date <= as_date(end_date))
+    if organization_id is not None:
+        query = query.filter(model.organization_id == organization_id)
+    return query
+
+def _period(group_by, column=Invoice.date):
+    # Date bucketing is dialect specific; weeks start on Monday in both
+    if db.engine.dialect.name == 'sqlite':
+        formats = {'day': '%Y-%m-%d', 'week': '%Y-%W', 'month': '%Y-%m'}
+        return func.strftime(formats[group_by], column)
+    formats = {'day': '%Y-%m-%d', 'week': '%Y-%u', 'month': '%Y-%m'}
+    return func.date_format(column, formats[group_by])
+
+def _revenue():
+    return func.coalesce(func.sum(InvoiceItem.qty * InvoiceItem.unit_price), 0)
+
+def _units():
+    return func.coalesce(func.sum(InvoiceItem.qty), 0)
+
+def sales_summary(start_date=None, end_date=None, organization_id=None):
+    if rollups_cover(start_date, end_date):
+        return _summary_from_rollups(start_date, end_date, organization_id)
+
+    # Two aggregate queries; no invoice or item rows are loaded into Python
+    invoice_totals = _filter_invoices(
+        db.session.query(func.count(Invoice.id), func.count(distinct(Invoice.customer_id))),
+        start_date, end_date, organization_id
+    ).one()
+
+    item_totals = _filter_invoices(
+        db.session.query(_revenue(), _units()).join(Invoice, InvoiceItem.invoice_id == Invoice.id),
+        start_date, end_date, organization_id
+    ).one()
+
+    return {
+        'total_invoices': invoice_totals[0],
+        'total_revenue': item_totals[0],
+        'total_customers': invoice_totals[1],
+        'total_products_sold': item_totals[1],
+    }
+
+def _summary_from_rollups(start_date, end_date, organization_id):
+    totals = _filter_invoices(
+        db.session.query(
+            func.coalesce(func.sum(SalesRollup.invoices), 0),
+            func.coalesce(func.sum(SalesRollup.revenue), 0),
+            func.count(distinct(SalesRollup.customer_id)),
+            func.coalesce(func.sum(SalesRollup.units), 0),
+        ),
+        start_date, end_date, organization_id, model=SalesRollup
+    ).one()
+
+    return {
+        'total_invoices': totals[0],
+        'total_revenue': totals[1],
+        'total_customers': totals[2],
+        'total_products_sold': totals[3],
+    }
+
+def _breakdown_from_rollups(group_by, start_date, end_date, organization_id):
+    # Product breakdowns come from the product rollup, everything else from
+    # the per-customer rollup; both keep customer_id so distinct customer
+    # counts stay exact
+    model = ProductSalesRollup if group_by == 'product' else SalesRollup
+    if group_by == 'customer':
+        keys = [SalesRollup.customer_id.label('customer_id'), Customer.name.label('customer_name')]
+    elif group_by == 'product':
+        keys = [ProductSalesRollup.product_id.label('product_id'), Product.name.label('product_name')]
+    else:
+        keys = [_period(group_by, SalesRollup.date).label(group_by)]
+
+    query = db.session.query(
+        *keys,
+        func.sum(model.invoices).label('invoices'),
+        func.count(distinct(model.customer_id)).label('customers'),
+        func.sum(model.revenue).label('revenue'),
+        func.sum(model.units).label('units_sold'),
+    ).select_from(model)
+
+    if group_by == 'customer':
+        query = query.outerjoin(Customer, Customer.id == SalesRollup.customer_id)
+    elif group_by == 'product':
+        query = query.outerjoin(Product, Product.id == ProductSalesRollup.product_id)
+
+    query = _filter_invoices(query, start_date, end_date, organization_id, model=model)
+    query = query.group_by(*keys).order_by(keys[0])
+    return query
+
+def sales_breakdown(group_by, start_date=None, end_date=None, organization_id=None):
+    if group_by not in GROUP_BY_CHOICES:
+        raise ValueError(f'group_by must be one of {", ".join(GROUP_BY_CHOICES)}')
+
+    columns = (['customer_id', 'customer_name'] if group_by == 'customer'
+               else ['product_id', 'product_name'] if group_by == 'product'
+               else [group_by]) + ['invoices', 'customers', 'revenue', 'units_sold']
+
+    if rollups_cover(start_date, end_date):
+        return columns, _breakdown_from_rollups(group_by, start_date, end_date, organization_id).yield_per(STREAM_BATCH_SIZE)
+
+    if group_by == 'customer':
+        keys = [Invoice.customer_id.label('customer_id'), Customer.name.label('customer_name')]
+    elif group_by == 'product':
+        keys = [InvoiceItem.product_id.label('product_id'), Product.name.label('product_name')]
+    else:
+        keys = [_period(group_by).label(group_by)]
+
+    query = db.session.query(
+        *keys,
+        func.count(distinct(Invoice.id)).label('invoices'),
+        func.count(distinct(Invoice.customer_id)).label('customers'),
+        _revenue().label('revenue'),
+        _units().label('units_sold'),
+    ).select_from(Invoice).outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+
+    if group_by == 'customer':
+        query = query.outerjoin(Customer, Customer.id == Invoice.customer_id)
+    elif group_by == 'product':
+        query = query.join(Product, Product.id == InvoiceItem.product_id)
+
+    query = _filter_invoices(query, start_date, end_date, organization_id)
+    query = query.group_by(*keys).order_by(keys[0])
+
+    # Rows are fetched from the cursor in batches as the response streams
+    return columns, query.yield_per(STREAM_BATCH_SIZE)
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def stream_json(columns, rows):
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps({column: _plain(value) for column, value in zip(columns, row)})
+    yield ']'
+
+def stream_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for index, row in enumerate(rows, 1):
+        writer.writerow([_plain(value) for value in row])
+        if index % STREAM_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
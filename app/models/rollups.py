@@ -0,0 +1,189 @@
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select, func, distinct
+from sqlalchemy.dialects import mysql, sqlite
+from .db import db, Invoice, InvoiceItem, SalesRollup, ProductSalesRollup, RollupCoverage
+
+CENT = Decimal('0.01')
+
+SALES_KEYS = ('organization_id', 'date', 'customer_id')
+PRODUCT_SALES_KEYS = ('organization_id', 'date', 'product_id', 'customer_id')
+# The columns behind uq_sales_rollup / uq_product_sales_rollup, where NULL
+# ids are stored as 0 so they conflict like any other key
+SALES_CONFLICT = ('organization_key', 'date', 'customer_key')
+PRODUCT_SALES_CONFLICT = ('organization_key', 'date', 'product_key', 'customer_key')
+
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _money(value):
+    # Match the Numeric(10, 2) rounding the database applies on insert
+    return Decimal(str(value or 0)).quantize(CENT)
+
+def upsert(model, rows, conflict, updates):
+    # One INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE, so concurrent
+    # writers neither race between UPDATE and INSERT nor lose changes.
+    # updates(new) maps column names to expressions over the existing row
+    # and the proposed row `new`.
+    if not rows:
+        return
+    if db.engine.dialect.name == 'sqlite':
+        statement = sqlite.insert(model).values(rows)
+        statement = statement.on_conflict_do_update(index_elements=list(conflict), set_=updates(statement.excluded))
+    else:
+        statement = mysql.insert(model).values(rows)
+        statement = statement.on_duplicate_key_update(updates(statement.inserted))
+    db.session.execute(statement)
+
+def _increment(model, columns, conflict, deltas):
+    # Rows go in key order so concurrent writers lock them in the same order
+    rows = [
+        dict(zip(columns, key), invoices=invoices, revenue=revenue, units=units)
+        for key, (invoices, revenue, units) in sorted(
+            deltas.items(), key=lambda entry: [(value is not None, value) for value in entry[0]])
+    ]
+    upsert(model, rows, conflict, lambda new: {
+        'invoices': model.invoices + new.invoices,
+        'revenue': model.revenue + new.revenue,
+        'units': model.units + new.units,
+    })
+
+def record_invoices(invoices, items):
+    # Fold newly written invoices into the rollups. Called by invoice
+    # writers inside their transaction, so rollups commit with the data.
+    # items are InvoiceItem column mappings (invoice_id, product_id, qty, unit_price).
+    by_id = {invoice.id: invoice for invoice in invoices}
+    sales = defaultdict(lambda: [0, Decimal(0), 0])
+    product_sales = defaultdict(lambda: [set(), Decimal(0), 0])
+
+    for invoice in invoices:
+        if invoice.date is not None:
+            sales[(invoice.organization_id, as_date(invoice.date), invoice.customer_id)][0] += 1
+
+    for item in items:
+        invoice = by_id[item['invoice_id']]
+        if invoice.date is None:
+            continue
+        qty = item.get('qty') or 0
+        amount = qty * _money(item.get('unit_price'))
+        day = as_date(invoice.date)
+
+        totals = sales[(invoice.organization_id, day, invoice.customer_id)]
+        totals[1] += amount
+        totals[2] += qty
+
+        totals = product_sales[(invoice.organization_id, day, item['product_id'], invoice.customer_id)]
+        totals[0].add(invoice.id)
+        totals[1] += amount
+        totals[2] += qty
+
+    _increment(SalesRollup, SALES_KEYS, SALES_CONFLICT, sales)
+    _increment(ProductSalesRollup, PRODUCT_SALES_KEYS, PRODUCT_SALES_CONFLICT, {
+        key: (len(invoice_ids), revenue, units) for key, (invoice_ids, revenue, units) in product_sales.items()
+    })
+
+
+def _in_range(query, column, start_date, end_date):
+    query = query.where(column.isnot(None))
+    if start_date:
+        query = query.where(column >= start_date)
+    if end_date:
+        query = query.where(column <= end_date)
+    return query
+
+def _sales_source(start_date=None, end_date=None):
+    query = select(
+        Invoice.organization_id, Invoice.date, Invoice.customer_id,
+        func.count(distinct(Invoice.id)),
+        func.coalesce(func.sum(InvoiceItem.qty * InvoiceItem.unit_price), 0),
+        func.coalesce(func.sum(InvoiceItem.qty), 0),
+    ).select_from(Invoice).outerjoin(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+    query = _in_range(query, Invoice.date, start_date, end_date)
+    return query.group_by(Invoice.organization_id, Invoice.date, Invoice.customer_id)
+
+def _product_sales_source(start_date=None, end_date=None):
+    query = select(
+        Invoice.organization_id, Invoice.date, InvoiceItem.product_id, Invoice.customer_id,
+        func.count(distinct(Invoice.id)),
+        func.coalesce(func.sum(InvoiceItem.qty * InvoiceItem.unit_price), 0),
+        func.coalesce(func.sum(InvoiceItem.qty), 0),
+    ).select_from(Invoice).join(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+    query = _in_range(query, Invoice.date, start_date, end_date)
+    return query.group_by(Invoice.organization_id, Invoice.date, InvoiceItem.product_id, Invoice.customer_id)
+
+def rebuild_rollups(start_date=None, end_date=None):
+    # Recompute the rollups for a date range (everything when no range is
+    # given) straight from Invoice/InvoiceItem with INSERT ... SELECT
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    try:
+        for model, columns, source in (
+            (SalesRollup, SALES_KEYS, _sales_source),
+            (ProductSalesRollup, PRODUCT_SALES_KEYS, _product_sales_source),
+        ):
+            delete = db.session.query(model)
+            if start_date:
+                delete = delete.filter(model.date >= start_date)
+            if end_date:
+                delete = delete.filter(model.date <= end_date)
+            delete.delete(synchronize_session=False)
+
+            db.session.execute(model.__table__.insert().from_select(
+                list(columns) + ['invoices', 'revenue', 'units'],
+                source(start_date, end_date)
+            ))
+
+        if start_date is None and end_date is None:
+            RollupCoverage.query.delete()
+        db.session.add(RollupCoverage(start_date=start_date, end_date=end_date))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def rollups_cover(start_date=None, end_date=None):
+    # True when some rebuild covered the whole requested range; writes
+    # since then were folded in incrementally, so the rollups are current
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    for coverage in RollupCoverage.query.all():
+        starts_in = coverage.start_date is None or (start_date is not None and coverage.start_date <= start_date)
+        ends_in = coverage.end_date is None or (end_date is not None and coverage.end_date >= end_date)
+        if starts_in and ends_in:
+            return True
+    return False
+
+def check_rollups(start_date=None, end_date=None):
+    # Compare the rollups with a fresh aggregate and list every key whose
+    # (invoices, revenue, units) disagree
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    mismatches = []
+    for model, columns, source in (
+        (SalesRollup, SALES_KEYS, _sales_source),
+        (ProductSalesRollup, PRODUCT_SALES_KEYS, _product_sales_source),
+    ):
+        size = len(columns)
+        expected = {
+            tuple(as_date(value) for value in row[:size]): (int(row[size]), _money(row[size + 1]), int(row[size + 2]))
+            for row in db.session.execute(source(start_date, end_date))
+        }
+
+        rollup_query = _in_range(select(
+            *[getattr(model, column) for column in columns], model.invoices, model.revenue, model.units
+        ), model.date, start_date, end_date)
+        actual = {
+            tuple(as_date(value) for value in row[:size]): (int(row[size]), _money(row[size + 1]), int(row[size + 2]))
+            for row in db.session.execute(rollup_query)
+        }
+
+        for key in expected.keys() | actual.keys():
+            if expected.get(key) != actual.get(key):
+                mismatches.append({
+                    'table': model.__tablename__,
+                    'key': dict(zip(columns, [value.isoformat() if isinstance(value, date) else value for value in key])),
+                    'expected': expected.get(key),
+                    'actual': actual.get(key)
+                })
+    return mismatches
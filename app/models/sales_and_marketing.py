@@ -1,64 +1,27 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+from .customer_scoring import customer_scorer, FEATURES as SCORING_FEATURES
+from .segmentation import segmentation_engine, FEATURES as SEGMENT_FEATURES
+from .recommendations import recommender
 
+# CLV and churn models are trained offline with `flask train-customer-models`
+# and only scored here, see customer_scoring
 def predict_clv(customers_df):
-    # Feature engineering
-    X = customers_df[['Recency', 'Frequency', 'Monetary']]
-    y = customers_df['CLV']  # Assuming 'CLV' is the target variable
-
-    # Split the data into training and test sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Train a Random Forest Regressor model
-    model = RandomForestRegressor(random_state=42)
-    model.fit(X_train, y_train)
-
-    # Make predictions
-    y_pred = model.predict(X_test)
-
-    # Evaluate the model
-    mse = mean_squared_error(y_test, y_pred)
-
-    return mse
+    clv, _ = customer_scorer.predict(customers_df[SCORING_FEATURES].to_numpy(dtype=float))
+    return clv
 
 def predict_churn(customers_df):
-    # Assuming 'Churn' is the target variable
-    X = customers_df[['Recency', 'Frequency', 'Monetary']]
-    y = customers_df['Churn']
-
-    # Split the data into training and test sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Train a Random Forest Classifier model
-    model = RandomForestClassifier(random_state=42)
-    model.fit(X_train, y_train)
-
-    # Make predictions
-    churn_predictions = model.predict(X_test)
+    _, churn_probability = customer_scorer.predict(customers_df[SCORING_FEATURES].to_numpy(dtype=float))
+    return (churn_probability >= 0.5).astype(int)
 
-    return churn_predictions
+def get_similar_customers(customer_id, k=50):
+    # Customer ids with the most similar purchase history, most similar first
+    matrix = recommender.matrix()
+    rows, _ = recommender.similar_customers(customer_id, k, matrix)
+    return [int(customer_id) for customer_id in matrix.customer_ids[rows]]
 
-def personalized_recommendations(customers_df, customer_id):
-    # Assuming 'Products' is a column containing the list of products purchased by each customer
-    customer_data = customers_df[customers_df['CustomerID'] == customer_id]
-    products_purchased = set(customer_data['Products'].iloc[0])
-
-    # Get similar customers (e.g., based on clustering)
-    similar_customers = get_similar_customers(customers_df, customer_id)
-
-    # Aggregate products purchased by similar customers
-    similar_products = []
-    for _, similar_customer in similar_customers.iterrows():
-        similar_products.extend(similar_customer['Products'])
-
-    # Filter out products already purchased by the customer
-    recommendations = set(similar_products) - products_purchased
-
-    return list(recommendations)[:5]  # Return top 5 recommendations
+def personalized_recommendations(customer_id, n=5):
+    # Products bought by similar customers but not by this one, best first
+    return [recommendation['product_id'] for recommendation in recommender.recommend(customer_id, n)]
 
 
 def process_sales_and_marketing(customers_df):
@@ -67,19 +30,22 @@ def process_sales_and_marketing(customers_df):
         segmented_customers = customer_segmentation(customers_df)
 
         # Predict CLV
-        clv_error = predict_clv(segmented_customers)
+        clv = predict_clv(segmented_customers)
 
         # Predict churn
         churn_predictions = predict_churn(segmented_customers)
 
         # Get personalized recommendations
-        recommendations = personalized_recommendations(segmented_customers)
+        recommendations = {
+            int(customer_id): personalized_recommendations(int(customer_id))
+            for customer_id in segmented_customers['CustomerID']
+        }
 
         return {
             'status': 'success',
             'data': {
                 'segmented_customers': segmented_customers,
-                'clv_error': clv_error,
+                'clv': clv,
                 'churn_predictions': churn_predictions,
                 'recommendations': recommendations
             }
@@ -91,28 +57,18 @@ def process_sales_and_marketing(customers_df):
         }
 
 
-def customer_segmentation(customers_df):
+def customer_segmentation(customers_df, organization_id=None, refit=False):
     # Feature selection: Recency, Frequency, Monetary
-    features = customers_df[['Recency', 'Frequency', 'Monetary']]
-
-    # Standardize the features
-    scaler = StandardScaler()
-    scaled_features = scaler.fit_transform(features)
-
-    # Determine the optimal number of clusters using the Elbow method
-    inertia = []
-    for n_clusters in range(1, 11):
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        kmeans.fit(scaled_features)
-        inertia.append(kmeans.inertia_)
+    features = customers_df[SEGMENT_FEATURES].to_numpy()
 
-    # Assuming the optimal number of clusters is 3 (elbow point)
-    n_clusters = 3
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    kmeans.fit(scaled_features)
+    # Customers are placed in the saved segments. Fitting (picking k from
+    # the elbow curve) only happens when asked, e.g. by `flask fit-segments`,
+    # or when no segmentation has been saved yet
+    if refit or segmentation_engine.get(organization_id) is None:
+        segmentation_engine.fit(features, organization_id)
 
     # Assign cluster labels to the original dataframe
-    customers_df['Cluster'] = kmeans.labels_
+    customers_df['Cluster'] = segmentation_engine.assign(features, organization_id)
 
     return customers_df
 
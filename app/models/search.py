@@ -0,0 +1,170 @@
+import re
+from sqlalchemy import text, inspect
+from sqlalchemy.orm import defer
+from symspellpy.symspellpy import Verbosity
+from .db import db, Document
+from .registry import registry
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+FUZZY_DICTIONARIES = ('symspell_id', 'symspell_en')
+MAX_FUZZY_ALTERNATIVES = 3
+
+
+def query_terms(query):
+    # Only word characters reach the engine, so user input can never be
+    # parsed as FTS5 or boolean-mode operators
+    return [term.lower() for term in TERM_PATTERN.findall(query or '')]
+
+def fuzzy_alternatives(term):
+    # Close spellings from the SymSpell dictionaries, so OCR typos in either
+    # the query or the documents still match
+    alternatives = []
+    for name in FUZZY_DICTIONARIES:
+        for suggestion in registry.get(name).lookup(term, Verbosity.CLOSEST, max_edit_distance=2):
+            if suggestion.term != term and suggestion.term not in alternatives:
+                alternatives.append(suggestion.term)
+    return alternatives[:MAX_FUZZY_ALTERNATIVES]
+
+
+# SQLite: a separate FTS5 table keyed by document id, kept in
+# sync explicitly whenever a document's text changes
+class SQLiteSearchBackend:
+    def ensure(self, conn):
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS document_fts USING fts5("
+            "text, corrected_text, manual_corrected_text, tokenize='unicode61 remove_diacritics 2')"
+        ))
+
+    def index_document(self, document):
+        self.remove(document.id)
+        db.session.execute(text(
+            "INSERT INTO document_fts(rowid, text, corrected_text, manual_corrected_text) "
+            "VALUES (:id, :text, :corrected_text, :manual_corrected_text)"
+        ), {
+            'id': document.id,
+            'text': document.text or '',
+            'corrected_text': document.corrected_text or '',
+            'manual_corrected_text': document.manual_corrected_text or ''
+        })
+
+    def remove(self, doc_id):
+        db.session.execute(text("DELETE FROM document_fts WHERE rowid = :id"), {'id': doc_id})
+
+    def match_expression(self, terms, fuzzy):
+        groups = []
+        for term in terms:
+            options = [f'"{term}"*'] + [f'"{alternative}"' for alternative in (fuzzy_alternatives(term) if fuzzy else [])]
+            groups.append('(' + ' OR '.join(options) + ')')
+        return ' AND '.join(groups)
+
+    def search(self, terms, fuzzy, limit, offset):
+        rows = db.session.execute(text(
+            "SELECT rowid, bm25(document_fts) AS score FROM document_fts "
+            "WHERE document_fts MATCH :match ORDER BY score LIMIT :limit OFFSET :offset"
+        ), {'match': self.match_expression(terms, fuzzy), 'limit': limit, 'offset': offset})
+        # bm25 is lower-is-better; flip it so higher scores rank first
+        return [(row[0], -row[1]) for row in rows]
+
+    def rebuild(self):
+        db.session.execute(text("DELETE FROM document_fts"))
+        db.session.execute(text(
+            "INSERT INTO document_fts(rowid, text, corrected_text, manual_corrected_text) "
+            "SELECT id, COALESCE(text, ''), COALESCE(corrected_text, ''), COALESCE(manual_corrected_text, '') FROM document"
+        ))
+
+
+# MySQL: a FULLTEXT index on the document table itself, which InnoDB keeps
+# up to date on every write
+class MySQLSearchBackend:
+    INDEX_NAME = 'ft_document_text'
+
+    def ensure(self, conn):
+        indexes = {index['name'] for index in inspect(conn).get_indexes('document')}
+        if self.INDEX_NAME not in indexes:
+            conn.execute(text(
+                f"ALTER TABLE document ADD FULLTEXT INDEX {self.INDEX_NAME} (text, corrected_text, manual_corrected_text)"
+            ))
+
+    def index_document(self, document):
+        pass
+
+    def remove(self, doc_id):
+        pass
+
+    def match_expression(self, terms, fuzzy):
+        groups = []
+        for term in terms:
+            options = [f'{term}*'] + (fuzzy_alternatives(term) if fuzzy else [])
+            groups.append('+(' + ' '.join(options) + ')')
+        return ' '.join(groups)
+
+    def search(self, terms, fuzzy, limit, offset):
+        rows = db.session.execute(text(
+            "SELECT id, MATCH(text, corrected_text, manual_corrected_text) AGAINST (:match IN BOOLEAN MODE) AS score "
+            "FROM document WHERE MATCH(text, corrected_text, manual_corrected_text) AGAINST (:match IN BOOLEAN MODE) "
+            "ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        ), {'match': self.match_expression(terms, fuzzy), 'limit': limit, 'offset': offset})
+        return [(row[0], row[1]) for row in rows]
+
+    def rebuild(self):
+        pass
+
+
+class SearchIndex:
+    def __init__(self):
+        self._backend = None
+
+    def init_app(self, app):
+        # Called once the tables exist, so requests never run DDL
+        with app.app_context():
+            self.ensure()
+
+    @property
+    def backend(self):
+        # Picked from the configured database the first time it is needed
+        if self._backend is None:
+            self._backend = SQLiteSearchBackend() if db.engine.dialect.name == 'sqlite' else MySQLSearchBackend()
+        return self._backend
+
+    def ensure(self):
+        # Create the FTS table / FULLTEXT index on a connection of its own,
+        # outside any session transaction
+        with db.engine.begin() as conn:
+            self.backend.ensure(conn)
+
+    def index_document(self, document):
+        # Runs inside the caller's transaction and never commits it; the
+        # caller's commit makes it visible
+        self.backend.index_document(document)
+
+    def remove(self, doc_id):
+        self.backend.remove(doc_id)
+
+    def rebuild(self):
+        self.backend.rebuild()
+        db.session.commit()
+
+    def search(self, query, page=1, per_page=20, fuzzy=True):
+        terms = query_terms(query)
+        if not terms:
+            return [], False
+
+        hits = self.backend.search(terms, fuzzy, per_page + 1, (page - 1) * per_page)
+        has_more = len(hits) > per_page
+        hits = hits[:per_page]
+
+        # Rows for the page only, without their text blobs
+        query = Document.query.filter(Document.id.in_([doc_id for doc_id, _ in hits])).options(
+            *[defer(getattr(Document, column)) for column in Document.TEXT_COLUMNS]
+        )
+        documents = {document.id: document for document in query}
+        results = []
+        for doc_id, score in hits:
+            if doc_id in documents:
+                result = documents[doc_id].serialize()
+                result['score'] = round(float(score), 4)
+                results.append(result)
+        return results, has_more
+
+
+search_index = SearchIndex()
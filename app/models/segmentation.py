@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+import numpy as np
+import joblib
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+FEATURES = ['Recency', 'Frequency', 'Monetary']
+
+
+def _inertia(features, n_clusters, minibatch):
+    # Module level so joblib can ship it to worker processes
+    model = _estimator(n_clusters, minibatch)
+    model.fit(features)
+    return model.inertia_
+
+def _estimator(n_clusters, minibatch):
+    if minibatch:
+        return MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=4096, n_init=3)
+    return KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+
+def pick_k(ks, inertias):
+    # Elbow: the k furthest below the straight line from the first to the
+    # last point of the normalized inertia curve
+    ks = np.asarray(ks, dtype=float)
+    inertias = np.asarray(inertias, dtype=float)
+    if len(ks) < 3 or inertias[0] == inertias[-1]:
+        return int(ks[0])
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    y = (inertias - inertias[-1]) / (inertias[0] - inertias[-1])
+    return int(ks[np.argmax((1 - x) - y)])
+
+
+# A fitted segmentation: the scaler and centroids are all that is needed to
+# place a customer, so new customers are assigned without refitting
+class SegmentModel:
+    def __init__(self, scaler, centroids, ks, inertias):
+        self.scaler = scaler
+        self.centroids = centroids
+        self.ks = list(ks)
+        self.inertias = list(inertias)
+        self.fitted_at = time.time()
+
+    @property
+    def k(self):
+        return len(self.centroids)
+
+    def assign(self, features):
+        scaled = self.scaler.transform(np.asarray(features, dtype=float))
+        # Squared distances to every centroid without materializing the
+        # (customers, k, features) difference array
+        distances = (scaled ** 2).sum(axis=1)[:, None] - 2 * scaled @ self.centroids.T + (self.centroids ** 2).sum(axis=1)
+        return distances.argmin(axis=1)
+
+    def summary(self):
+        return {
+            'k': self.k,
+            'elbow': dict(zip(self.ks, [round(value, 3) for value in self.inertias])),
+            'fitted_at': self.fitted_at
+        }
+
+
+# Fits one segmentation per organization and keeps it in memory and on disk.
+# The k-sweep runs in parallel worker processes on a sample of customers;
+# large sets are fitted with MiniBatchKMeans.
+class SegmentationEngine:
+    def __init__(self, cache_dir='models/segments', max_k=10, workers=-1, sample_size=50000,
+                 minibatch_threshold=100000):
+        self.cache_dir = cache_dir
+        self.max_k = max_k
+        self.workers = workers
+        self.sample_size = sample_size
+        self.minibatch_threshold = minibatch_threshold
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.cache_dir = os.path.join(app.config.get('MODEL_ARTIFACT_DIR', 'models'), 'segments')
+        self.max_k = app.config.get('SEGMENTATION_MAX_K', self.max_k)
+        self.workers = app.config.get('SEGMENTATION_WORKERS', self.workers)
+        self.minibatch_threshold = app.config.get('SEGMENTATION_MINIBATCH_THRESHOLD', self.minibatch_threshold)
+
+    def _path(self, organization_id):
+        return os.path.join(self.cache_dir, f'segments_{organization_id or "all"}.joblib')
+
+    def fit(self, features, organization_id=None, n_clusters=None):
+        features = np.asarray(features, dtype=float)
+        scaler = StandardScaler().fit(features)
+        scaled = scaler.transform(features)
+        minibatch = len(scaled) > self.minibatch_threshold
+
+        ks, inertias = [], []
+        if n_clusters is None:
+            sample = scaled
+            if len(sample) > self.sample_size:
+                sample = sample[np.random.default_rng(42).choice(len(sample), self.sample_size, replace=False)]
+            ks = list(range(1, min(self.max_k, len(sample)) + 1))
+            inertias = Parallel(n_jobs=self.workers)(
+                delayed(_inertia)(sample, k, len(sample) > self.minibatch_threshold) for k in ks
+            )
+            n_clusters = pick_k(ks, inertias)
+
+        estimator = _estimator(n_clusters, minibatch).fit(scaled)
+        model = SegmentModel(scaler, estimator.cluster_centers_, ks, inertias)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{self._path(organization_id)}.{os.getpid()}.tmp'
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, self._path(organization_id))
+        with self._lock:
+            self._models[organization_id] = model
+        return model
+
+    def get(self, organization_id=None):
+        model = self._models.get(organization_id)
+        if model is None and os.path.exists(self._path(organization_id)):
+            model = joblib.load(self._path(organization_id))
+            with self._lock:
+                self._models[organization_id] = model
+        return model
+
+    def assign(self, features, organization_id=None):
+        model = self.get(organization_id)
+        if model is None:
+            raise LookupError(f'No segmentation fitted for organization {organization_id}')
+        return model.assign(features)
+
+
+segmentation_engine = SegmentationEngine()
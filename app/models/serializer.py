@@ -0,0 +1,127 @@
+import json
+import threading
+from decimal import Decimal
+from sqlalchemy import DateTime, Date, Numeric, TIMESTAMP
+
+# Optional fast encoders, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def _converter(column_type):
+    # Same text forms the hand-written serialize() methods produced
+    if isinstance(column_type, (DateTime, TIMESTAMP)):
+        return lambda value: value.strftime(DATETIME_FORMAT) if value is not None else None
+    if isinstance(column_type, Date):
+        return lambda value: value.strftime(DATE_FORMAT) if value is not None else None
+    if isinstance(column_type, Numeric):
+        return lambda value: str(value) if value is not None else None
+    return None
+
+
+# Per-model list of (name, column, converter), built once and reused for
+# every row so serializing does no per-row type inspection
+class FieldPlan:
+    def __init__(self, model, exclude=()):
+        self.model = model
+        self.fields = []
+        for column in model.__table__.columns:
+            if column.key in exclude:
+                continue
+            self.fields.append((column.key, getattr(model, column.key), _converter(column.type)))
+        self.names = [name for name, _, _ in self.fields]
+        self.columns = [attribute for _, attribute, _ in self.fields]
+        self.converters = [convert for _, _, convert in self.fields]
+
+    def row(self, values):
+        return {
+            name: convert(value) if convert else value
+            for name, convert, value in zip(self.names, self.converters, values)
+        }
+
+    def rows(self, tuples):
+        for values in tuples:
+            yield self.row(values)
+
+
+def plan_for(model, exclude=()):
+    key = (model, tuple(exclude))
+    plan = _plans.get(key)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.setdefault(key, FieldPlan(model, exclude))
+    return plan
+
+def serialize_object(obj, exclude=()):
+    plan = plan_for(type(obj), exclude)
+    return plan.row(getattr(obj, name) for name in plan.names)
+
+def column_rows(query, exclude=()):
+    # Fetch only the planned columns as tuples; no ORM objects are built
+    plan = plan_for(query.column_descriptions[0]['entity'], exclude)
+    return plan, query.with_entities(*plan.columns)
+
+def serialize_query(query, exclude=()):
+    plan, rows = column_rows(query, exclude)
+    return list(plan.rows(rows))
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not serializable')
+
+FORMATS = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+def available_formats():
+    formats = ['json']
+    if msgpack is not None:
+        formats.append('msgpack')
+    if pyarrow is not None:
+        formats.append('arrow')
+    return formats
+
+def encode(query, output='json', exclude=()):
+    if output not in available_formats():
+        raise ValueError(f'Unsupported format {output!r}, available: {", ".join(available_formats())}')
+
+    plan, rows = column_rows(query, exclude)
+
+    if output == 'arrow':
+        # Columnar with native types (dates, decimals) for analytics tools
+        columns = list(zip(*rows)) or [[] for _ in plan.names]
+        table = pyarrow.table({name: list(values) for name, values in zip(plan.names, columns)})
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    data = list(plan.rows(rows))
+    if output == 'msgpack':
+        return msgpack.packb(data, default=_default)
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default)
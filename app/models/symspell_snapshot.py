@@ -0,0 +1,83 @@
+import os
+import glob
+import hashlib
+import logging
+from importlib.metadata import version
+from symspellpy.symspellpy import SymSpell
+
+# Bump when the snapshot layout changes so old files are ignored
+SNAPSHOT_FORMAT = 1
+
+DICTIONARY_DIR = os.path.dirname(__file__)
+DICTIONARIES = {
+    'id': 'frequency_dictionary_id.txt',
+    'en': 'frequency_dictionary_en.txt',
+}
+SNAPSHOT_DIR = os.path.join(DICTIONARY_DIR, 'symspell_snapshots')
+# symspellpy has no __version__ attribute; read it from package metadata
+SYMSPELLPY_VERSION = version('symspellpy')
+
+
+def init_app(app):
+    global SNAPSHOT_DIR
+    SNAPSHOT_DIR = app.config.get('SYMSPELL_SNAPSHOT_DIR') or SNAPSHOT_DIR
+
+def dictionary_path(language):
+    return os.path.join(DICTIONARY_DIR, DICTIONARIES[language])
+
+def dictionary_hash(language):
+    digest = hashlib.sha256()
+    with open(dictionary_path(language), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_path(language, max_edit_distance, prefix_length, source_hash=None):
+    # The name pins everything the index depends on, so a changed source
+    # dictionary, parameter or library version points at a new file
+    source_hash = source_hash or dictionary_hash(language)
+    name = (f'{language}-v{SNAPSHOT_FORMAT}-symspellpy{SYMSPELLPY_VERSION}'
+            f'-d{max_edit_distance}-p{prefix_length}-{source_hash[:16]}.pickle')
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def build_from_dictionary(language, max_edit_distance, prefix_length):
+    symspell = SymSpell(max_edit_distance, prefix_length)
+    # utf-8-sig strips the BOM at the start of the English dictionary
+    symspell.load_dictionary(dictionary_path(language), 0, 1, encoding='utf-8-sig')
+    return symspell
+
+def build_snapshot(language, max_edit_distance=2, prefix_length=7):
+    source_hash = dictionary_hash(language)
+    path = snapshot_path(language, max_edit_distance, prefix_length, source_hash)
+    symspell = build_from_dictionary(language, max_edit_distance, prefix_length)
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.part'
+    # Uncompressed so loading is a straight unpickle with no gzip pass
+    symspell.save_pickle(tmp_path, compressed=False)
+    os.replace(tmp_path, path)
+
+    # Remove snapshots built from older dictionaries or settings
+    for stale in glob.glob(os.path.join(SNAPSHOT_DIR, f'{language}-*.pickle')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    logging.info(f'Built SymSpell snapshot {path}')
+    return symspell, path
+
+def load_symspell(language, max_edit_distance=2, prefix_length=7):
+    path = snapshot_path(language, max_edit_distance, prefix_length)
+    if os.path.exists(path):
+        symspell = SymSpell(max_edit_distance, prefix_length)
+        try:
+            symspell.load_pickle(path, compressed=False)
+            return symspell
+        except Exception as e:
+            logging.warning(f'Ignoring unreadable SymSpell snapshot {path}: {e}')
+
+    # Missing or outdated snapshot, rebuild it from the source dictionary
+    symspell, _ = build_snapshot(language, max_edit_distance, prefix_length)
+    return symspell
@@ -1,17 +1,32 @@
-import os
+import json
+import time
 import logging
 import openai
-import re
 
-from flask import Blueprint, request, redirect, url_for, render_template, flash, current_app, jsonify
+from flask import Blueprint, request, redirect, url_for, render_template, flash, current_app, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from datetime import datetime 
+from datetime import datetime, timedelta
 from .models.db import db, Document, Organization, Customer, Supplier, Product, ProductImage, Invoice, InvoiceItem, Purchase, PurchaseItem, Issuer, Account, AccountTransaction
-from .models.ocr import scan_and_detect, extract_text_from_image, correct_text, preprocess_image
+from .models.ocr import scan_and_detect, scan_and_detect_images, preprocess_image
 from .models.payment import process_payment
 from .models.customer_service import generate_response
-from .models.goods_receipt import verify_goods_receipt
+from .models.llm_client import llm_client, LLMUnavailable
+from .models.goods_receipt import process_goods_receipt
 from .models.sales_and_marketing import process_sales_and_marketing
+from .models.customer_scoring import customer_scorer
+from .models.recommendations import recommender
+from .models.reader_pool import reader_pool
+from .models.object_detection import detection_service, load_rgb
+from .models.batch_ocr import is_pdf, extract_pages_from_files
+from .models.jobs import job_queue, job_status, PENDING, DONE, FAILED
+from .models.doc_cache import save_upload, result_cache
+from .models.registry import registry
+from .models.correction import correction_cache
+from .models.invoice_parser import extract_invoice_fields, field_value
+from .models.invoice_writer import save_invoices
+from .models.reporting import sales_summary, sales_breakdown, stream_json, stream_csv
+from .models.serializer import encode, FORMATS as SERIALIZER_FORMATS
+from .models.search import search_index
 
 main_bp = Blueprint('main', __name__)
 
@@ -34,13 +49,7 @@ def scan_item():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        image_path = os.path.join(upload_folder, filename)
-        file.save(image_path)
+        _, image_path = save_upload(file, current_app.config['UPLOAD_FOLDER'])
         
         # Perform object detection and OCR
         detected_items = scan_and_detect(image_path)
@@ -48,129 +57,86 @@ def scan_item():
         return jsonify(detected_items), 200
     
     return jsonify({'error': 'Invalid file type'}), 400
-import re
 
 
-def parse_invoice(text):
-    
-        
+def parse_invoice(text, fields=None):
+    # All fields come from a single scan of the text, see invoice_parser
+    fields = fields if fields is not None else extract_invoice_fields(text)
     invoice_data = {}
     if isinstance(text, str):
-        invoice_number_patterns = [
-            r'Invoice\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
-            r'INV\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
-            r'No\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
-            r'Nomor\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
-            r'Nota\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
-            r'Faktur\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)'
-        ]
-        
-        for pattern in invoice_number_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                invoice_data['invoice_number'] = match.group(1)
-                break  
-        
-        # Date pattern
-        date_patterns = [ 
-            r'Date\s*[\s:#-]*\s*(\S+)',
-            r'Tanggal\s*[\s:#-]*\s*(\S+)'
-        ]
-        for pattern in date_patterns:
-            match = re.search(pattern, text)
-            if match:
-                invoice_data['date'] = match.group(1)
-                break  
-        
-        # Subtotal pattern
-        subtotal_pattern = r'Subtotal\s*[:#-]*\s*\$?([\d.]+)'
-        match = re.search(subtotal_pattern, text)
-        invoice_data['subtotal'] = match.group(1) if match else None
-        
-        # Total pattern
-        total_pattern = r'(?:Total|Jumlah)\s*[:#-]*\s*\$?([\d.]+)'
-        match = re.search(total_pattern, text)
-        invoice_data['total'] = match.group(1) if match else None
+        if 'invoice_number' in fields:
+            invoice_data['invoice_number'] = field_value(fields, 'invoice_number')
+        if 'date' in fields:
+            invoice_data['date'] = field_value(fields, 'date')
+        invoice_data['subtotal'] = field_value(fields, 'subtotal')
+        invoice_data['total'] = field_value(fields, 'total')
     
     return invoice_data
 
-def parse_customer(text):
-        
+def parse_customer(text, fields=None):
+    fields = fields if fields is not None else extract_invoice_fields(text)
     customer_data = {}
     if isinstance(text, str):
-        name_match = re.search(r'(?:Customer|To|Kepada)\s*[:]*\s*(.+)', text)
-        address_match = re.search(r'(?:Address|Ship|Alamat)\s*[:]*\s*(.+)', text)
-        phone_match = re.search(r'(?:Phone|Telp)\s*[:]*\s*(\S+)', text)
-        
-        customer_data['name'] = name_match.group(1) if name_match else None
-        customer_data['address'] = address_match.group(1) if address_match else None
-        customer_data['phone'] = phone_match.group(1) if phone_match else None
+        customer_data['name'] = field_value(fields, 'customer_name')
+        customer_data['address'] = field_value(fields, 'customer_address')
+        customer_data['phone'] = field_value(fields, 'customer_phone')
     
     return customer_data
 
-def parse_products(text):
-  
+def parse_products(text, fields=None):
+    fields = fields if fields is not None else extract_invoice_fields(text)
     products = []
-    if isinstance(text, str):
-        product_pattern = re.compile(r'(\d+)\s+([^0-9]+)\s+(\d{1,3}(?:,\d{3})*\.\d{2})\s+(\d{1,3}(?:,\d{3})*\.\d{2})')
-        
-        for match in product_pattern.finditer(text):
-            product_data = {
-                'quantity': int(match.group(1)),
-                'description': match.group(2).strip(),
-                'unit_price': float(match.group(3).replace(',', '')),
-                'amount': float(match.group(4).replace(',', ''))
-            }
-            products.append(product_data)
+    for found in fields.get('product', []):
+        quantity, description, unit_price, amount = found['value']
+        product_data = {
+            'quantity': int(quantity),
+            'description': description.strip(),
+            'unit_price': float(unit_price.replace(',', '')),
+            'amount': float(amount.replace(',', ''))
+        }
+        products.append(product_data)
     return products
     
+def parse_invoice_document(text):
+    fields = extract_invoice_fields(text)
+    return {
+        'invoice': parse_invoice(text, fields),
+        'customer': parse_customer(text, fields),
+        'products': parse_products(text, fields)
+    }
+
 def save_invoice_data(text):
-    invoice_data = parse_invoice(text)
-    customer_data = parse_customer(text)
-    products_data = parse_products(text)
-    
-    customer = Customer.query.filter_by(name=customer_data['name']).first()
-    if not customer:
-        customer = Customer(
-            name=customer_data['name'],
-            address=customer_data['address'],
-            phone=customer_data['phone']
-        )
-        db.session.add(customer)
-        db.session.commit()
-    
-    invoice = Invoice(
-        date=datetime.strptime(invoice_data['date'], '%Y-%m-%d'),
-        customer_id=customer.id,
-        subtotal=float(invoice_data['subtotal']),
-        total=float(invoice_data['total'])
-    )
-    db.session.add(invoice)
-    db.session.commit()
-    
-    for product_data in products_data:
-        product = Product.query.filter_by(name=product_data['name']).first()
-        if not product:
-            product = Product(
-                name=product_data['name'],
-                unit_price=product_data['unit_price']
-            )
-            db.session.add(product)
-            db.session.commit()
-        
-        invoice_item = InvoiceItem(
-            invoice_id=invoice.id,
-            product_id=product.id,
-            qty=product_data['quantity'],
-            unit_price=product.unit_price,
-            total=product_data['quantity'] * product.unit_price
-        )
-        db.session.add(invoice_item)
-    
-    db.session.commit()
+    # Customers and products are resolved in batch and everything is
+    # written in one transaction, see invoice_writer
+    _, errors = save_invoices([parse_invoice_document(text)])
+    if errors:
+        raise ValueError(errors[0]['error'])
     
     return 'invoice successfully processed'
 
+# Route to save many invoice texts at once, e.g. for backfills
+@main_bp.route('/invoices/bulk', methods=['POST'])
+def bulk_invoices():
+    data = request.get_json()
+    texts = data.get('texts') if data else None
+
+    if not texts:
+        return jsonify({'status': 'error', 'message': 'No invoice texts provided'}), 400
+
+    try:
+        invoices, errors = save_invoices([parse_invoice_document(text) for text in texts], data.get('organization_id'))
+    except Exception as e:
+        logging.error(f'Bulk invoice import failed: {e}')
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    # Invalid invoices are skipped and reported by their position in texts
+    status = 'success' if not errors else 'partial' if invoices else 'error'
+    return jsonify({
+        'status': status,
+        'invoice_ids': [invoice.id for invoice in invoices],
+        'errors': errors
+    }), 200 if invoices else 400
+
 
 @main_bp.route('/upload', methods=['GET', 'POST'])
 def upload():
@@ -183,32 +149,59 @@ def upload():
             flash('No selected file')
             return redirect(request.url)
         if file:
-            # Ensure the upload folder exists
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            if not os.path.exists(upload_folder):
-                os.makedirs(upload_folder)
-
-            file_path = os.path.join(upload_folder, secure_filename(file.filename))
-            file.save(file_path)
+            # Uploads are stored by content hash so re-uploads are detected
+            content_hash, file_path = save_upload(file, current_app.config['UPLOAD_FOLDER'])
 
             # Log the file path
             logging.info(f'File saved at: {file_path}')
-            #preprocessed_image_path = preprocess_image(file_path)
-            extracted_text = extract_text_from_image(file_path)
-            #extracted_text =extract_text_with_deep_learning(file_path)
+
             doc_type = request.form.get('doc_type')
-            corrected_text, labeled_text = correct_text(extracted_text)
 
+            # Same content was processed before, reuse its results
+            cached = result_cache.get(content_hash)
+            if cached:
+                new_document = Document(
+                    filename=file.filename,
+                    text=cached['text'],
+                    corrected_text=cached['corrected_text'],
+                    labeled_text=cached['labeled_text'],
+                    doc_type=doc_type,
+                    manual_corrected_text='',
+                    content_hash=content_hash,
+                    status=DONE
+                )
+                db.session.add(new_document)
+                db.session.flush()
+                search_index.index_document(new_document)
+                db.session.commit()
+                logging.info(f'Reused cached OCR results for {content_hash}')
+                return redirect(url_for('main.edit', doc_id=new_document.id))
+
+            # Reject early when the ingestion queue is saturated
+            if job_queue.full():
+                flash('Server is busy processing documents, please try again shortly')
+                return redirect(request.url)
+
+            # OCR and correction run on the job workers; the document stays
+            # pending until they finish
             new_document = Document(
                 filename=file.filename, 
-                text=extracted_text, 
-                corrected_text=corrected_text,
-                labeled_text=labeled_text,
+                text='',
                 doc_type=doc_type,
-                manual_corrected_text=''
+                manual_corrected_text='',
+                content_hash=content_hash,
+                status=PENDING
             )
             db.session.add(new_document)
             db.session.commit()
+
+            if not job_queue.submit(new_document.id, file_path):
+                new_document.status = FAILED
+                new_document.error = 'Job queue is full'
+                db.session.commit()
+                flash('Server is busy processing documents, please try again shortly')
+                return redirect(request.url)
+
             return redirect(url_for('main.edit', doc_id=new_document.id))
             
     return render_template('upload.html')
@@ -219,11 +212,11 @@ def edit(doc_id):
     if request.method == 'POST':
         updated_text = request.form['documentText']
         document.manual_corrected_text = updated_text
+        search_index.index_document(document)
         db.session.commit()
         
         
-        data = parse_invoice(updated_text)
-        save_invoice_data(data)
+        save_invoice_data(updated_text)
             
         ''' 
         doc_type =document.doc_type
@@ -253,7 +246,201 @@ def edit(doc_id):
         
         return redirect(url_for('main.dashboard'))
 
-    return render_template('edit.html', doc_id=doc_id, doc_text=document.manual_corrected_text or document.corrected_text)
+    return render_template('edit.html', doc_id=doc_id, doc_text=document.manual_corrected_text or document.corrected_text, status=document.status)
+
+def document_filters():
+    # Shared query-string filters for the document listing routes
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    return {
+        'start_date': datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None,
+        'end_date': datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) if end_date_str else None,
+        'doc_type': request.args.get('doc_type'),
+        'manual_corrected_only': request.args.get('manual_corrected_only') == '1'
+    }
+
+@main_bp.route('/documents', methods=['GET'])
+def documents():
+    try:
+        documents, next_cursor = Document.page_documents(
+            cursor=request.args.get('cursor'),
+            limit=min(request.args.get('limit', 50, type=int), 500),
+            **document_filters()
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    next_url = None
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        next_url = url_for('main.documents', **args)
+    return render_template('documents.html', documents=documents, next_url=next_url)
+
+# Route to list documents page by page; pass the returned cursor to get the next page
+@main_bp.route('/api/documents', methods=['GET'])
+def api_documents():
+    include_text = request.args.get('include_text') == '1'
+    try:
+        documents, next_cursor = Document.page_documents(
+            cursor=request.args.get('cursor'),
+            limit=min(request.args.get('limit', 50, type=int), 500),
+            include_text=include_text,
+            **document_filters()
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify({
+        'documents': [document.serialize(include_text) for document in documents],
+        'next_cursor': next_cursor
+    }), 200
+
+# Route to full-text search documents, best matches first
+@main_bp.route('/api/search', methods=['GET'])
+def search_documents():
+    query = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    fuzzy = request.args.get('fuzzy', '1') != '0'
+
+    results, has_more = search_index.search(query, page=page, per_page=per_page, fuzzy=fuzzy)
+    return jsonify({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        'documents': results
+    }), 200
+
+# Route to export every matching document as newline-delimited JSON
+@main_bp.route('/api/documents/export', methods=['GET'])
+def export_documents():
+    include_text = request.args.get('include_text') == '1'
+    try:
+        filters = document_filters()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    def generate():
+        cursor = None
+        while True:
+            documents, cursor = Document.page_documents(cursor=cursor, limit=1000, include_text=include_text, **filters)
+            lines = [json.dumps(document.serialize(include_text)) + '\n' for document in documents]
+            # Drop the batch from the session so memory stays flat
+            db.session.expunge_all()
+            yield ''.join(lines)
+            if cursor is None:
+                return
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Tables that can be exported in bulk, with the same fields as serialize()
+EXPORT_MODELS = {
+    'customers': (Customer, ()),
+    'products': (Product, ('organization_id',)),
+    'invoices': (Invoice, ('organization_id',)),
+    'invoice_items': (InvoiceItem, ('organization_id',)),
+    'purchases': (Purchase, ('organization_id',)),
+    'purchase_items': (PurchaseItem, ('organization_id',)),
+    'accounts': (Account, ('organization_id',)),
+    'account_transactions': (AccountTransaction, ('organization_id',)),
+}
+
+# Route to export a whole table as JSON, msgpack or Arrow IPC for analytics
+@main_bp.route('/api/export/<name>', methods=['GET'])
+def export_table(name):
+    if name not in EXPORT_MODELS:
+        return jsonify({'status': 'error', 'message': f'Unknown table {name}'}), 404
+
+    model, exclude = EXPORT_MODELS[name]
+    output = request.args.get('format', 'json')
+    organization_id = request.args.get('organization_id', type=int)
+
+    query = model.query
+    if organization_id is not None:
+        query = query.filter(model.organization_id == organization_id)
+
+    try:
+        body = encode(query.order_by(model.id), output, exclude)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return Response(body, mimetype=SERIALIZER_FORMATS[output])
+
+# Route to score CLV and churn probability for a set of customers, e.g.
+# /api/customers/scores?ids=1,2,3 or a JSON body {"customer_ids": [1, 2, 3]}
+@main_bp.route('/api/customers/scores', methods=['GET', 'POST'])
+def customer_scores():
+    if request.method == 'POST':
+        customer_ids = (request.get_json(silent=True) or {}).get('customer_ids') or []
+    else:
+        customer_ids = [value for value in request.args.get('ids', '').split(',') if value]
+    try:
+        customer_ids = [int(value) for value in customer_ids]
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Customer ids must be integers'}), 400
+    if not customer_ids or len(customer_ids) > 1000:
+        return jsonify({'status': 'error', 'message': 'Provide between 1 and 1000 customer ids'}), 400
+
+    try:
+        scores = customer_scorer.score(customer_ids, request.args.get('organization_id', type=int))
+    except LookupError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    return jsonify({'version': customer_scorer.stats()['version'], 'scores': scores}), 200
+
+# Route to recommend products for a customer from similar customers' purchases
+@main_bp.route('/api/customers/<int:customer_id>/recommendations', methods=['GET'])
+def customer_recommendations(customer_id):
+    n = min(max(request.args.get('n', 5, type=int), 1), 100)
+    return jsonify({'customer_id': customer_id, 'recommendations': recommender.recommend(customer_id, n)}), 200
+
+# Route to report the size and freshness of the recommendation matrix
+@main_bp.route('/api/recommendations/stats', methods=['GET'])
+def recommendation_stats():
+    return jsonify(recommender.stats()), 200
+
+# Route to poll the processing status of an uploaded document
+@main_bp.route('/jobs/<int:doc_id>', methods=['GET'])
+def job(doc_id):
+    document = Document.query.get(doc_id)
+    if document is None:
+        return jsonify({'status': 'error', 'message': 'Document not found'}), 404
+
+    data = job_status(document)
+    if document.status == DONE:
+        data['text'] = document.manual_corrected_text or document.corrected_text
+    return jsonify(data), 200
+
+# Route to follow the processing status as a server-sent event stream
+@main_bp.route('/jobs/<int:doc_id>/stream', methods=['GET'])
+def job_stream(doc_id):
+    timeout = current_app.config['JOB_STREAM_TIMEOUT']
+
+    def generate():
+        last = None
+        waited = 0
+        while waited <= timeout:
+            db.session.expire_all()
+            document = Document.query.get(doc_id)
+            if document is None:
+                yield 'event: error\ndata: {}\n\n'
+                return
+            data = job_status(document)
+            if data != last:
+                yield f'data: {json.dumps(data)}\n\n'
+                last = data
+            if document.status in (DONE, FAILED):
+                return
+            time.sleep(1)
+            waited += 1
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+@main_bp.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    stats = job_queue.stats()
+    stats['cache'] = result_cache.stats()
+    return jsonify(stats), 200
 
 
 @main_bp.before_app_request
@@ -266,25 +453,68 @@ def index():
 
 @main_bp.route('/dashboard')
 def dashboard():
-    return render_template('dashboard.html')
+    # Last 30 days of sales, served from the rollups once they are built
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=29)
+    summary = sales_summary(start_date, end_date)
+    return render_template('dashboard.html', summary=summary)
 
 # Route to upload multiple images for batch processing (optional)
 @main_bp.route('/batch_scan', methods=['POST'])
 def batch_scan():
     files = request.files.getlist('images')
-    results = []
+    upload_folder = current_app.config['UPLOAD_FOLDER']
 
+    saved = []
     for file in files:
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            image_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(image_path)
-            
-            detected_items = scan_and_detect(image_path)
-            results.append({filename: detected_items})
+            _, image_path = save_upload(file, upload_folder)
+            saved.append((filename, image_path))
+
+    # PDF pages from every uploaded file are OCR'd together in batches
+    pdf_paths = list(dict.fromkeys(path for _, path in saved if is_pdf(path)))
+    pdf_pages = extract_pages_from_files(pdf_paths) if pdf_paths else {}
+
+    # The other images go through detection and recognition in one batch
+    image_paths = list(dict.fromkeys(path for _, path in saved if not is_pdf(path)))
+    scanned = scan_and_detect_images([load_rgb(path) for path in image_paths]) if image_paths else []
+    image_items = dict(zip(image_paths, scanned))
+
+    results = []
+    for filename, image_path in saved:
+        if is_pdf(image_path):
+            results.append({filename: pdf_pages[image_path]})
+        else:
+            results.append({filename: image_items[image_path]})
 
     return jsonify(results), 200
 
+# Route to inspect how often OCR requests reuse a pooled reader
+@main_bp.route('/ocr/pool_stats', methods=['GET'])
+def ocr_pool_stats():
+    return jsonify(reader_pool.stats()), 200
+
+# Route to report spelling correction throughput and cache usage
+@main_bp.route('/ocr/correction_stats', methods=['GET'])
+def correction_stats():
+    return jsonify(correction_cache.stats()), 200
+
+# Route to report object detection latency and throughput
+@main_bp.route('/detection/stats', methods=['GET'])
+def detection_stats():
+    return jsonify(detection_service.stats()), 200
+
+# Route to report LLM cache, coalescing and circuit breaker state
+@main_bp.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm_client.stats()), 200
+
+# Route to report load time and memory of every registered model
+@main_bp.route('/models/stats', methods=['GET'])
+def model_stats():
+    return jsonify(registry.stats()), 200
+
 @main_bp.route('/payment', methods=['POST'])
 def payment():
     data = request.get_json()
@@ -313,8 +543,7 @@ def receive_goods():
     if not expected_items:
         return jsonify({'status': 'error', 'message': 'No expected items provided'}), 400
 
-    image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image.filename)
-    image.save(image_path)
+    _, image_path = save_upload(image, current_app.config['UPLOAD_FOLDER'])
 
     expected_items = json.loads(expected_items)  # Ensure expected_items is in correct format
 
@@ -322,16 +551,13 @@ def receive_goods():
     return jsonify(response), 200
     
 def generate_analysis(summary):
-    openai.api_key = current_app.config['OPENAI_API_KEY']
-    
     prompt = f"Generate a business analysis and recommendations based on the following data: {summary}"
-    response = openai.Completion.create(
-        model="davinci",
-        prompt=prompt,
-        max_tokens=500
-    )
-    
-    return response.choices[0].text.strip()
+    # Same summary, same analysis: served from the LLM client's cache
+    try:
+        return llm_client.complete(prompt, model="davinci", max_tokens=500)
+    except (openai.OpenAIError, LLMUnavailable) as e:
+        logging.error(f'Sales analysis unavailable: {e}')
+        return 'Analysis is not available right now, please try again later.'
     
 @main_bp.route('/sales_report', methods=['GET', 'POST'])
 def sales_report():
@@ -341,8 +567,8 @@ def sales_report():
 
         # Check if dates are provided
         if not start_date_str or not end_date_str:
-            start_date = datetime.min  # Default start date (earliest possible)
-            end_date = datetime.max    # Default end date (latest possible)
+            start_date = None  # No lower bound
+            end_date = None    # No upper bound
         else:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
@@ -350,28 +576,34 @@ def sales_report():
             except ValueError as e:
                 return f"Error parsing dates: {e}"
 
-        # Fetch data from the database
-        if start_date and end_date:
-            invoices = db.session.query(Invoice).filter(Invoice.date.between(start_date, end_date)).all()
-            invoice_items = db.session.query(InvoiceItem).join(Invoice).filter(Invoice.date.between(start_date, end_date)).all()
-        else:
-            invoices = db.session.query(Invoice).all()
-            invoice_items = db.session.query(InvoiceItem).all()
-
-        customers = db.session.query(Customer).all()
-        products = db.session.query(Product).all()
+        # Totals are aggregated in the database, see reporting
+        summary = sales_summary(start_date, end_date)
 
-        summary = {
-            'total_invoices': len(invoices),
-            'total_revenue': sum(item.price * item.quantity for item in invoice_items),
-            'total_customers': len(customers),
-            'total_products_sold': sum(item.quantity for item in invoice_items),
-        }
-
-        generate_analysis(summary)
+        analysis = generate_analysis(summary)
 
         return render_template('sales_report_result.html', summary=summary, analysis=analysis)
 
     # Render the form initially
     return render_template('sales_report.html')
 
+# Route to stream sales grouped by day, week, month, customer or product
+@main_bp.route('/sales_report/data', methods=['GET'])
+def sales_report_data():
+    group_by = request.args.get('group_by', 'month')
+    output = request.args.get('format', 'json')
+    organization_id = request.args.get('organization_id', type=int)
+
+    try:
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
+        columns, rows = sales_breakdown(group_by, start_date, end_date, organization_id)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    if output == 'csv':
+        return Response(stream_with_context(stream_csv(columns, rows)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename=sales_by_{group_by}.csv'})
+    return Response(stream_with_context(stream_json(columns, rows)), mimetype='application/json')
+
@@ -6,3 +6,71 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'uploads'
     OPENAI_API_KEY = 'Your Open API Key'
+    # Completions endpoint; point at `flask llm-stub` for local testing
+    OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE')
+    # Seconds before an LLM call is abandoned, cached answers kept and for
+    # how long, and consecutive failures that open the circuit breaker for
+    # LLM_RESET_SECONDS
+    LLM_TIMEOUT = int(os.environ.get('LLM_TIMEOUT', 20))
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', 1000))
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 3600))
+    LLM_FAILURE_THRESHOLD = 5
+    LLM_RESET_SECONDS = 30
+    # Number of EasyOCR readers kept per language set in each worker
+    OCR_READER_POOL_SIZE = int(os.environ.get('OCR_READER_POOL_SIZE', 1))
+    OCR_READER_GPU = False
+    # Set to a directory to dump every preprocessing stage for debugging
+    OCR_DEBUG_DIR = os.environ.get('OCR_DEBUG_DIR')
+    # Rasterization resolution for PDF uploads and pages per OCR batch
+    OCR_PDF_DPI = 200
+    OCR_BATCH_SIZE = int(os.environ.get('OCR_BATCH_SIZE', 8))
+    # Detected boxes read by region OCR: smallest side in pixels, lowest
+    # detection confidence, and boxes recognized per batch
+    OCR_REGION_MIN_SIZE = 16
+    OCR_REGION_MIN_CONFIDENCE = 0.3
+    OCR_REGION_BATCH_SIZE = int(os.environ.get('OCR_REGION_BATCH_SIZE', 16))
+    # Detector weights (YOLOv8 or YOLOv5u) shared by item scanning and goods receipts
+    DETECTION_MODEL_PATH = os.environ.get('DETECTION_MODEL_PATH', 'yolov8n.pt')
+    # Images per object detection batch and CPU threads given to the detector
+    DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', 8))
+    DETECTION_THREADS = int(os.environ.get('DETECTION_THREADS', 0)) or None
+    # 'torch' or 'onnx'; the ONNX model is written by `flask export-detector`
+    # and can be run by other providers such as OpenVINOExecutionProvider
+    DETECTION_BACKEND = os.environ.get('DETECTION_BACKEND', 'torch')
+    DETECTION_ONNX_PATH = os.environ.get('DETECTION_ONNX_PATH', 'models/detector.onnx')
+    DETECTION_ONNX_PROVIDERS = None
+    # Document ingestion workers, queue capacity before uploads are rejected,
+    # attempts per document before it is marked failed, and seconds after
+    # which a document still processing is assumed abandoned by its worker
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 32))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 3600))
+    JOB_STREAM_TIMEOUT = 300
+    # OCR results cached by upload content hash, least recently used first out
+    OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', 'ocr_cache')
+    OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Models to load at startup instead of on first use: a list of registry
+    # names such as ['spacy_en', 'symspell_id'], 'all', or None
+    MODEL_WARMUP = None
+    MODEL_WARMUP_BACKGROUND = True
+    # Where prebuilt SymSpell indexes are kept (defaults next to the dictionaries)
+    SYMSPELL_SNAPSHOT_DIR = os.environ.get('SYMSPELL_SNAPSHOT_DIR')
+    # Corrected (language, token) pairs kept in memory per worker
+    CORRECTION_CACHE_SIZE = int(os.environ.get('CORRECTION_CACHE_SIZE', 100000))
+    # Fitted analytics models (customer segments, ...) are saved here
+    MODEL_ARTIFACT_DIR = os.environ.get('MODEL_ARTIFACT_DIR', 'models')
+    # Largest k tried by the segmentation elbow search, worker processes for
+    # the sweep (-1 for every core), and the customer count above which
+    # MiniBatchKMeans replaces KMeans
+    SEGMENTATION_MAX_K = 10
+    SEGMENTATION_WORKERS = int(os.environ.get('SEGMENTATION_WORKERS', -1))
+    SEGMENTATION_MINIBATCH_THRESHOLD = 100000
+    # Customers per CLV/churn scoring batch
+    SCORING_BATCH_SIZE = 10000
+    # Seconds between incremental refreshes of the recommendation matrix,
+    # seconds between full rebuilds (which drop edited or deleted invoices)
+    # and similar customers consulted per recommendation
+    RECOMMENDATION_REFRESH_SECONDS = 60
+    RECOMMENDATION_REBUILD_SECONDS = 86400
+    RECOMMENDATION_NEIGHBORS = 50
@@ -0,0 +1,58 @@
+"""Document job state columns
+
+Revision ID: 3f2a9c1d7b41
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Databases created by db.create_all before this revision already have the
+# document table, and newer ones may already have some of these columns,
+# so only what is missing is added
+def _columns():
+    return [
+        sa.Column('content_hash', sa.String(length=64), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='done'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    ]
+
+INDEX = 'ix_document_content_hash'
+
+
+def _existing():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('document')}
+    indexes = {index['name'] for index in inspector.get_indexes('document')}
+    return columns, indexes
+
+
+def upgrade():
+    columns, indexes = _existing()
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        for column in _columns():
+            if column.name not in columns:
+                batch_op.add_column(column)
+    if INDEX not in indexes:
+        op.create_index(INDEX, 'document', ['content_hash'], unique=False)
+
+
+def downgrade():
+    columns, indexes = _existing()
+    if INDEX in indexes:
+        op.drop_index(INDEX, table_name='document')
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        for column in reversed(_columns()):
+            if column.name in columns:
+                batch_op.drop_column(column.name)
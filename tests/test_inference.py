@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+from app.models.inference import OnnxBackend, letterbox, postprocess
+from app.models.detection_benchmark import iou, parity
+
+
+def yolov8_output(rows, classes=2, anchors=16):
+    # (4 + classes, anchors): cx, cy, w, h then one score per class
+    output = np.zeros((4 + classes, anchors), dtype=np.float32)
+    for anchor, (cx, cy, w, h, class_id, score) in enumerate(rows):
+        output[:4, anchor] = [cx, cy, w, h]
+        output[4 + class_id, anchor] = score
+    return output
+
+def yolov5_output(rows, classes=2, anchors=16):
+    # (anchors, 5 + classes): cx, cy, w, h, objectness, class scores
+    output = np.zeros((anchors, 5 + classes), dtype=np.float32)
+    for anchor, (cx, cy, w, h, class_id, objectness, score) in enumerate(rows):
+        output[anchor, :5] = [cx, cy, w, h, objectness]
+        output[anchor, 5 + class_id] = score
+    return output
+
+
+def test_letterbox_keeps_aspect_ratio_and_pads():
+    image = np.full((100, 200, 3), 7, dtype=np.uint8)
+    padded, (scale, left, top) = letterbox(image, 64)
+    assert padded.shape == (64, 64, 3)
+    assert (scale, left, top) == (0.32, 0, 16)
+    assert (padded[:16] == 114).all() and (padded[48:] == 114).all()
+    assert (padded[16:48] == 7).all()
+
+def test_postprocess_maps_boxes_back_to_the_image():
+    # A box given in original image coordinates, moved into letterbox space
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    _, transform = letterbox(image, 64)
+    scale, left, top = transform
+    box = np.array([40.0, 20.0, 120.0, 60.0])
+    cx, cy = (box[0] + box[2]) / 2 * scale + left, (box[1] + box[3]) / 2 * scale + top
+    w, h = (box[2] - box[0]) * scale, (box[3] - box[1]) * scale
+
+    detections = postprocess(yolov8_output([(cx, cy, w, h, 1, 0.9)]), transform, image.shape[:2])
+    assert detections.shape == (1, 6)
+    np.testing.assert_allclose(detections[0, :4], box, atol=1e-3)
+    assert detections[0, 4] == pytest.approx(0.9)
+    assert detections[0, 5] == 1
+
+def test_postprocess_filters_and_suppresses_per_class():
+    transform = (1.0, 0, 0)
+    detections = postprocess(yolov8_output([
+        (50, 50, 20, 20, 0, 0.9),
+        (51, 51, 20, 20, 0, 0.8),   # overlaps the first, same class: suppressed
+        (51, 51, 20, 20, 1, 0.7),   # same place, other class: kept
+        (10, 10, 4, 4, 0, 0.1),     # below the confidence threshold
+    ]), transform, (100, 100))
+    assert detections[:, 5].tolist() == [0, 1]
+    assert detections[:, 4] == pytest.approx([0.9, 0.7])
+
+def test_postprocess_yolov5_layout_uses_objectness():
+    detections = postprocess(yolov5_output([
+        (30, 30, 10, 10, 1, 0.5, 0.8),   # 0.4 overall
+        (70, 70, 10, 10, 0, 0.4, 0.5),   # 0.2 overall: dropped
+    ]), (1.0, 0, 0), (100, 100))
+    assert len(detections) == 1
+    assert detections[0, 4] == pytest.approx(0.4)
+    np.testing.assert_allclose(detections[0, :4], [25, 25, 35, 35])
+
+def test_postprocess_clips_and_handles_no_detections():
+    detections = postprocess(yolov8_output([(5, 5, 20, 20, 0, 0.9)]), (1.0, 0, 0), (100, 100))
+    np.testing.assert_allclose(detections[0, :4], [0, 0, 15, 15])
+    empty = postprocess(yolov8_output([]), (1.0, 0, 0), (100, 100))
+    assert empty.shape == (0, 6)
+
+
+def test_iou():
+    assert iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(50 / 150)
+    assert iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+
+def test_parity_of_matching_outputs():
+    reference = [np.array([[0, 0, 10, 10, 0.9, 0], [20, 20, 40, 40, 0.8, 1]]), np.zeros((0, 6))]
+    candidate = [np.array([[1, 0, 10, 10, 0.85, 0], [20, 20, 40, 40, 0.8, 1]]), np.zeros((0, 6))]
+    result = parity(reference, candidate)
+    assert result['recall'] == 1.0 and result['precision'] == 1.0
+    assert result['mean_iou'] == pytest.approx((0.9 + 1.0) / 2)
+    assert result['max_confidence_delta'] == pytest.approx(0.05)
+
+def test_parity_counts_misses_and_extra_boxes():
+    reference = [np.array([[0, 0, 10, 10, 0.9, 0], [20, 20, 40, 40, 0.8, 1]])]
+    candidate = [np.array([[0, 0, 10, 10, 0.9, 1], [20, 20, 40, 40, 0.8, 1], [50, 50, 60, 60, 0.5, 0]])]
+    result = parity(reference, candidate)
+    # The first box has the wrong class, the third has no counterpart
+    assert result['recall'] == 0.5
+    assert result['precision'] == pytest.approx(0.3333)
+
+def test_onnx_backend_matches_reference_detections():
+    # A stand-in session returns the raw outputs a model would give for
+    # boxes known in image coordinates; the backend has to recover them
+    images = [np.zeros((100, 200, 3), dtype=np.uint8), np.zeros((300, 150, 3), dtype=np.uint8)]
+    reference = [np.array([[40, 20, 120, 60, 0.9, 0]]), np.array([[10, 50, 100, 250, 0.8, 1]])]
+
+    class Session:
+        def run(self, names, feeds):
+            outputs = []
+            for image, boxes in zip(images, reference):
+                _, (scale, left, top) = letterbox(image, 64)
+                outputs.append(yolov8_output([
+                    ((x1 + x2) / 2 * scale + left, (y1 + y2) / 2 * scale + top, (x2 - x1) * scale, (y2 - y1) * scale,
+                     int(class_id), score)
+                    for x1, y1, x2, y2, score, class_id in boxes
+                ]))
+            assert feeds['images'].shape == (2, 3, 64, 64)
+            return [np.stack(outputs)]
+
+    backend = OnnxBackend.__new__(OnnxBackend)
+    backend.session, backend.input_name, backend.input_size = Session(), 'images', 64
+    result = parity(reference, backend.predict(images))
+    assert result['recall'] == 1.0 and result['precision'] == 1.0
+    assert result['mean_iou'] > 0.99
+    assert result['max_confidence_delta'] < 1e-6
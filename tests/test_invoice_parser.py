@@ -0,0 +1,112 @@
+import re
+import pytest
+from app.models.invoice_parser import FieldExtractor, FIELD_PATTERNS, extract_invoice_fields, field_value, labels
+
+
+# The original route parsers, one re.search per pattern in priority order.
+# extract_invoice_fields has to give the same values.
+def reference_fields(text):
+    fields = {}
+    for pattern in [
+        r'Invoice\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        r'INV\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        r'No\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        r'Nomor\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        r'Nota\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+        r'Faktur\s*[\s:#-]*Number\s*[:#-]*\s*(\S+)',
+    ]:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            fields['invoice_number'] = match.group(1)
+            break
+    for pattern in [r'Date\s*[\s:#-]*\s*(\S+)', r'Tanggal\s*[\s:#-]*\s*(\S+)']:
+        match = re.search(pattern, text)
+        if match:
+            fields['date'] = match.group(1)
+            break
+    for field, pattern in [
+        ('subtotal', r'Subtotal\s*[:#-]*\s*\$?([\d.]+)'),
+        ('total', r'(?:Total|Jumlah)\s*[:#-]*\s*\$?([\d.]+)'),
+        ('customer_name', r'(?:Customer|To|Kepada)\s*[:]*\s*(.+)'),
+        ('customer_address', r'(?:Address|Ship|Alamat)\s*[:]*\s*(.+)'),
+        ('customer_phone', r'(?:Phone|Telp)\s*[:]*\s*(\S+)'),
+    ]:
+        match = re.search(pattern, text)
+        fields[field] = match.group(1) if match else None
+    fields['product'] = [list(match.groups()) for match in re.finditer(
+        r'(\d+)\s+([^0-9]+)\s+(\d{1,3}(?:,\d{3})*\.\d{2})\s+(\d{1,3}(?:,\d{3})*\.\d{2})', text)]
+    return fields
+
+def extracted_fields(text):
+    fields = extract_invoice_fields(text)
+    values = {name: field_value(fields, name) for name in FIELD_PATTERNS if name != 'product'}
+    values['product'] = [found['value'] for found in fields.get('product', [])]
+    if 'invoice_number' not in fields:
+        values.pop('invoice_number')
+    if 'date' not in fields:
+        values.pop('date')
+    return values
+
+
+SAMPLES = [
+    'Invoice Number: INV-001\nDate: 2024-01-31\nCustomer: Budi Santoso\nAddress: Jl. Merdeka 1\nPhone: 0812\n'
+    '2 Widget A 10.00 20.00\n1 Gadget B 1,250.00 1,250.00\nSubtotal: 1270.00\nTotal: 1270.00',
+    'FAKTUR NUMBER 77/X\nTanggal 01/02/2024\nKepada: PT Maju\nAlamat Bandung\nTelp 022-123\nJumlah 500.00',
+    'nota number: A1 invoice number: B2',
+    'Total: 100.00\nCustomer: Budi',
+    'Telp 021 Total 5',
+    'Ship to warehouse\nTo: Ani',
+    '',
+    'no labels here at all',
+]
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_matches_one_search_per_pattern(text):
+    assert extracted_fields(text) == reference_fields(text)
+
+def test_earliest_label_wins_even_inside_another_word():
+    # 'To' inside 'Total' is found first, exactly as the original parser did
+    assert field_value(extract_invoice_fields('Total: 100.00\nCustomer: Budi'), 'customer_name') == 'tal: 100.00'
+    assert field_value(extract_invoice_fields('Telp 021 Total 5'), 'customer_name') == 'tal 5'
+
+def test_priority_beats_position():
+    fields = extract_invoice_fields('nota number: A1 invoice number: B2')
+    assert fields['invoice_number']['value'] == 'B2'
+    assert fields['invoice_number']['confidence'] == 1.0
+
+def test_spans_point_into_text():
+    text = 'Date: 2024-01-31'
+    found = extract_invoice_fields(text)['date']
+    start, end = found['span']
+    assert text[start:end] == found['value']
+
+def test_registered_pattern_is_used():
+    extractor = FieldExtractor(FIELD_PATTERNS)
+    extractor.register('po_number', r'PO\s*#\s*(\S+)')
+    assert extractor.extract('PO # 991')['po_number']['value'] == '991'
+    assert 'po_number' not in extractor.extract('nothing')
+
+def test_every_top_level_alternative_is_a_label():
+    assert labels(r'Nota\s+(\S+)|Faktur\s+(\S+)') == ['Nota', 'Faktur']
+    assert labels(r'(?:Total|Jumlah)\s*(\d+)|Sum\s*(\d+)') == ['Total', 'Jumlah', 'Sum']
+    assert labels(r'Nota\s+(\S+)|\d+') is None
+    assert labels(r'[A|B]x') is None
+
+    extractor = FieldExtractor({'number': {'patterns': [r'Nota\s+(\S+)|Faktur\s+(\S+)']}})
+    assert extractor.extract('Faktur 12')['number']['value'] == [None, '12']
+    assert extractor.extract('Nota 7 Faktur 12')['number']['value'] == ['7', None]
+
+def test_unlabelled_patterns_always_run():
+    extractor = FieldExtractor({'amount': {'patterns': [r'\$(\d+)|(\d+)\s*USD']}})
+    assert extractor.extract('pay 40 USD')['amount']['value'] == [None, '40']
+
+def test_large_catalog_gives_the_same_results():
+    # Hundreds of supplier layouts whose labels never occur in the text
+    catalog = {name: dict(spec, patterns=list(spec['patterns'])) for name, spec in FIELD_PATTERNS.items()}
+    for i in range(300):
+        catalog['invoice_number']['patterns'].append(rf'Supplier{i}Ref\s*[:#-]*\s*(\S+)')
+        catalog['total'] = dict(catalog['total'], patterns=catalog['total']['patterns'] + [rf'Grand{i}Total\s*(\S+)'])
+    extractor = FieldExtractor(catalog)
+    for text in SAMPLES:
+        assert extractor.extract(text) == extract_invoice_fields(text)
+    assert extractor.extract('Supplier123Ref: X-9')['invoice_number']['value'] == 'X-9'
@@ -0,0 +1,126 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from app.models.llm_client import LLMClient, LLMUnavailable
+from app.models.llm_stub import make_handler
+
+MODEL = 'gpt-3.5-turbo-instruct'
+
+
+@pytest.fixture
+def stub():
+    # Starts a stub completions server on a free port and returns its api_base
+    servers = []
+
+    def start(delay=0.0, fail_every=0):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(delay, fail_every))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def client_for(api_base, **options):
+    return LLMClient(api_key='test', api_base=api_base, **{'timeout': 5, **options})
+
+def answer_number(text):
+    # The stub numbers its answers, one per upstream call
+    return int(text.split('#')[1].split()[0])
+
+
+def test_cache_hit_and_ttl_expiry(stub):
+    client = client_for(stub(), cache_ttl=0.2)
+    first = client.complete('Hello', MODEL)
+    assert client.complete('  hello ', MODEL) == first
+    assert client.stats()['hits'] == 1
+
+    time.sleep(0.3)
+    assert answer_number(client.complete('Hello', MODEL)) == 2
+    assert client.stats()['misses'] == 2
+
+def test_lru_eviction(stub):
+    client = client_for(stub(), cache_size=2)
+    a = client.complete('a', MODEL)
+    b = client.complete('b', MODEL)
+    assert client.complete('a', MODEL) == a
+    client.complete('c', MODEL)
+
+    assert client.complete('a', MODEL) == a
+    assert client.complete('b', MODEL) != b
+    assert client.stats()['cached'] == 2
+
+def test_identical_prompts_share_one_call(stub):
+    client = client_for(stub(delay=0.5))
+    barrier = threading.Barrier(5)
+    answers = []
+
+    def ask():
+        barrier.wait()
+        answers.append(client.complete('Same question', MODEL))
+
+    threads = [threading.Thread(target=ask) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(answers) == 5
+    assert {answer_number(answer) for answer in answers} == {1}
+    stats = client.stats()
+    assert stats['misses'] == 1
+    assert stats['coalesced'] == 4
+    assert stats['in_flight'] == 0
+
+def test_follower_times_out(stub):
+    client = client_for(stub(delay=1.0))
+    leader = threading.Thread(target=client.complete, args=('Slow question', MODEL))
+    leader.start()
+    while not client.stats()['in_flight']:
+        time.sleep(0.01)
+
+    # Followers wait at most the client timeout for the leader's answer
+    client.timeout = 0.1
+    started = time.time()
+    with pytest.raises(LLMUnavailable):
+        client.complete('Slow question', MODEL)
+    assert time.time() - started < 0.5
+    leader.join()
+
+def test_breaker_opens_after_threshold(stub):
+    client = client_for(stub(fail_every=1), failure_threshold=3, reset_seconds=60)
+    for number in range(3):
+        with pytest.raises(Exception) as error:
+            client.complete(f'question {number}', MODEL)
+        assert not isinstance(error.value, LLMUnavailable)
+    assert client.stats()['circuit'] == 'open'
+
+    with pytest.raises(LLMUnavailable):
+        client.complete('question 4', MODEL)
+    stats = client.stats()
+    assert stats['errors'] == 3
+    assert stats['rejected'] == 1
+
+def test_half_open_trial(stub):
+    client = client_for(stub(fail_every=1), failure_threshold=2, reset_seconds=0.2)
+    for number in range(2):
+        with pytest.raises(Exception):
+            client.complete(f'question {number}', MODEL)
+
+    # A failed trial opens the breaker again
+    time.sleep(0.3)
+    with pytest.raises(Exception) as error:
+        client.complete('trial', MODEL)
+    assert not isinstance(error.value, LLMUnavailable)
+    with pytest.raises(LLMUnavailable):
+        client.complete('trial', MODEL)
+
+    # A successful trial closes it
+    client.api_base = stub()
+    time.sleep(0.3)
+    assert answer_number(client.complete('trial', MODEL)) == 1
+    assert client.stats()['circuit'] == 'closed'
+    client.complete('after', MODEL)
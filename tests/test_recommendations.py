@@ -0,0 +1,36 @@
+import numpy as np
+from scipy import sparse
+from app.models.recommendations import PurchaseMatrix, Recommender
+
+
+def recommender_for(purchases):
+    # purchases: {customer_id: {product_id: qty}}
+    customer_ids = np.array(sorted(purchases), dtype=np.int64)
+    product_ids = np.array(sorted({product for bought in purchases.values() for product in bought}), dtype=np.int64)
+    columns = {product_id: column for column, product_id in enumerate(product_ids)}
+    counts = sparse.lil_matrix((len(customer_ids), len(product_ids)))
+    for row, customer_id in enumerate(customer_ids):
+        for product_id, qty in purchases[customer_id].items():
+            counts[row, columns[product_id]] = qty
+
+    recommender = Recommender(refresh_seconds=3600)
+    recommender._matrix = PurchaseMatrix(customer_ids, product_ids, counts, last_item_id=0)
+    recommender._built_at = recommender._matrix.checked_at
+    return recommender
+
+def recommended(recommender, customer_id, n=5):
+    return [item['product_id'] for item in recommender.recommend(customer_id, n)]
+
+
+def test_recommends_what_similar_customers_bought():
+    recommender = recommender_for({1: {10: 1, 11: 1}, 2: {10: 1, 11: 1, 12: 3}, 3: {13: 5}})
+    assert recommended(recommender, 1) == [12]
+
+def test_popularity_fallback_skips_products_already_bought():
+    # Customer 3 shares no product with anyone, so the fallback is used
+    recommender = recommender_for({1: {10: 9}, 2: {10: 5, 11: 2}, 3: {12: 20}})
+    assert recommended(recommender, 3) == [10, 11]
+
+def test_unknown_customer_gets_most_bought_products():
+    recommender = recommender_for({1: {10: 9}, 2: {10: 5, 11: 2}})
+    assert recommended(recommender, 99) == [10, 11]